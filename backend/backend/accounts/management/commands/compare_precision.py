@@ -0,0 +1,96 @@
+import time
+import numpy as np
+import rasterio
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+
+from processing import model_registry
+from processing.tiling import iter_blocks
+from processing.palette import CLASS_NAMES, NODATA_CLASS
+from processing.LULC_inference import run_lulc_inference, OUTPUT_MASK as LULC_MASK_DIR
+from processing.inference import generate_deforestation_mask, OUTPUT_MASK as DEFORESTATION_MASK_DIR
+
+
+class Command(BaseCommand):
+    help = "Compare reduced-precision inference against fp32: pixel agreement and speed-up"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--model", choices=["lulc", "deforestation"], required=True, help="Model to compare")
+        parser.add_argument("--image", type=str, help="Sentinel-2 GeoTIFF (lulc)")
+        parser.add_argument("--before", type=str, help="Before image (deforestation)")
+        parser.add_argument("--after", type=str, help="After image (deforestation)")
+        parser.add_argument("--precision", choices=sorted(model_registry.PRECISIONS), default="bf16",
+                            help="Precision to compare against fp32")
+
+    def handle(self, *args, **options):
+        name = options["model"]
+        precision = options["precision"]
+
+        if name == "lulc":
+            if not options["image"]:
+                raise CommandError("--image is required for the lulc model")
+            out_dir = LULC_MASK_DIR
+            stem = Path(options["image"]).stem
+
+            def run(model, output_path):
+                return run_lulc_inference(options["image"], "compare", model=model, output_path=output_path)
+        else:
+            if not (options["before"] and options["after"]):
+                raise CommandError("--before and --after are required for the deforestation model")
+            out_dir = DEFORESTATION_MASK_DIR
+            stem = Path(options["after"]).stem
+
+            def run(model, output_path):
+                return generate_deforestation_mask(
+                    options["before"], options["after"], stem, model=model, output_path=output_path
+                )
+
+        results = {}
+        for label in ("fp32", precision):
+            model = model_registry.get_model(model_registry.variant(name, label))
+            start = time.perf_counter()
+            path = run(model, out_dir / f"{stem}_{label}_COMPARE.tif")
+            results[label] = (path, time.perf_counter() - start)
+
+        ref_path, ref_s = results["fp32"]
+        test_path, test_s = results[precision]
+        # Deforestation masks are 0/255 change maps with no nodata class
+        nodata = NODATA_CLASS if name == "lulc" else None
+        agree, total, per_class = _agreement(ref_path, test_path, nodata)
+
+        self.stdout.write(f"fp32 mask:   {ref_path}  ({ref_s:.1f}s)")
+        self.stdout.write(f"{precision} mask:   {test_path}  ({test_s:.1f}s)")
+        self.stdout.write(f"Speed-up:          {ref_s / max(test_s, 1e-9):.2f}x")
+        self.stdout.write(self.style.SUCCESS(
+            f"Pixel agreement:   {agree / max(total, 1):.4%} ({total - agree} of {total} pixels differ)"
+        ))
+
+        if name == "lulc":
+            for cls, (cls_agree, cls_total) in per_class.items():
+                if cls_total:
+                    self.stdout.write(
+                        f"  {CLASS_NAMES[cls]:<16} {cls_agree / cls_total:.4%} of {cls_total} fp32 pixels"
+                    )
+
+
+def _agreement(ref_path, test_path, nodata=None):
+    """Counts matching pixels block by block; per-class agreement is relative to the fp32 mask."""
+    agree = total = 0
+    per_class = {}
+
+    with rasterio.open(ref_path) as ref, rasterio.open(test_path) as test:
+        for block in iter_blocks(ref.height, ref.width, 1024):
+            a = ref.read(1, window=block)
+            b = test.read(1, window=block)
+            valid = a != nodata if nodata is not None else np.ones(a.shape, dtype=bool)
+
+            same = (a == b) & valid
+            agree += int(same.sum())
+            total += int(valid.sum())
+
+            for cls in np.unique(a[valid]):
+                in_cls = a == cls
+                hit, n = per_class.get(int(cls), (0, 0))
+                per_class[int(cls)] = (hit + int((same & in_cls).sum()), n + int(in_cls.sum()))
+
+    return agree, total, dict(sorted(per_class.items()))
@@ -10,6 +10,7 @@ class Command(BaseCommand):
         parser.add_argument("--radius", type=float, required=True, help="Radius in kilometers")
         parser.add_argument("--year", type=int, required=True, help="Year of LULC data")
         parser.add_argument("--id", type=str, default="test_location", help="Location ID")
+        parser.add_argument("--study", type=int, default=None, help="LULCStudy ID to report progress on")
 
     def handle(self, *args, **options):
         lat = options["lat"]
@@ -17,10 +18,11 @@ class Command(BaseCommand):
         radius = options["radius"]
         year = options["year"]
         loc_id = options["id"]
+        study_id = options["study"]
 
         self.stdout.write(self.style.NOTICE(f"Submitting Celery job for {loc_id}..."))
 
-        task = run_LULC_job.delay(lat, lon, radius, year, loc_id)
+        task = run_LULC_job.delay(lat, lon, radius, year, loc_id, study_id)
 
         self.stdout.write(self.style.SUCCESS(f"Task Submitted! Celery Task ID = {task.id}"))
         self.stdout.write("Check status using:")
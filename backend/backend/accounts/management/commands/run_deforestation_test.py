@@ -1,27 +1,25 @@
-# from django.core.management.base import BaseCommand
-# from accounts.tasks import run_deforestation_job
+from django.core.management.base import BaseCommand
+from accounts.tasks import run_deforestation_job
 
-# class Command(BaseCommand):
-#     help = "Trigger a Celery deforestation job"
+class Command(BaseCommand):
+    help = "Trigger a Celery deforestation job"
 
-#     def add_arguments(self, parser):
-#         parser.add_argument("--lat", type=float, required=True, help="Latitude")
-#         parser.add_argument("--lon", type=float, required=True, help="Longitude")
-#         parser.add_argument("--radius", type=float, required=True, help="Radius in kilometers")
-#         parser.add_argument("--year", type=float, required=True, help="Year of deforestation data")
-#         parser.add_argument("--id", type=str, default="test_location", help="Location ID")
+    def add_arguments(self, parser):
+        parser.add_argument("--lat", type=float, required=True, help="Latitude")
+        parser.add_argument("--lon", type=float, required=True, help="Longitude")
+        parser.add_argument("--id", type=str, default="test_location", help="Location ID")
+        parser.add_argument("--request", type=int, default=None, help="ParsedRequest ID to record the run on")
 
-#     def handle(self, *args, **options):
-#         lat = options["lat"]
-#         lon = options["lon"]
-#         radius = options["radius"]
-#         year = options["year"]
-#         loc_id = options["id"]
+    def handle(self, *args, **options):
+        lat = options["lat"]
+        lon = options["lon"]
+        loc_id = options["id"]
+        request_id = options["request"]
 
-#         self.stdout.write(self.style.NOTICE(f"Submitting Celery job for {loc_id}..."))
+        self.stdout.write(self.style.NOTICE(f"Submitting Celery job for {loc_id}..."))
 
-#         task = run_deforestation_job.delay(lat, lon, loc_id)
+        task = run_deforestation_job.delay(lat, lon, loc_id, request_id)
 
-#         self.stdout.write(self.style.SUCCESS(f"Submitted! Celery Task ID = {task.id}"))
-#         self.stdout.write("Check status using:")
-#         self.stdout.write(f"  celery -A backend inspect active")
+        self.stdout.write(self.style.SUCCESS(f"Submitted! Celery Task ID = {task.id}"))
+        self.stdout.write("Check status using:")
+        self.stdout.write(f"  celery -A backend inspect active")
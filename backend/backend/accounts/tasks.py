@@ -1,42 +1,293 @@
 # queries/tasks.py
 
-from celery import shared_task
+import time
+from pathlib import Path
+
+from celery import shared_task, chain, chord
+from django.db import transaction
+from django.utils import timezone
 #from processing.imagery_downloader import download_pair
-from processing.inference import generate_deforestation_mask
+from processing.inference import generate_deforestation_mask, MODEL_PATH as DEFORESTATION_MODEL_PATH
 from processing.newDownloader import download_pair
 from processing.LULC_Downloader import LULC_Temp_Downloader
-from processing.LULC_inference import run_lulc_inference
+from processing.LULC_inference import run_lulc_inference, lulc_mask_path
 from processing.LULC_Mask import save_colored_mask
-from processing.LULC_Image_Acquistion import download_large_area
+from processing.LULC_Image_Acquistion import download_large_area, plan_tiles, download_tile
 from processing.LULC_multiple_image_inference import run_inference_on_tiles
 from processing.stitch_masks import stitch_masks
 from processing.stitch_imagery import stitch_images
+from processing.class_stats import ClassStats, compute_stats
+from lulc.models import LULCStudy, LULCYearResult, LULCConclusion
+from deforestation.models import DeforestationRun
+from queries.models import ParsedRequest
+
+def _fail_deforestation_run(parsed_request_id, message, timings):
+    if parsed_request_id is None:
+        return
+    DeforestationRun.objects.filter(parsed_request_id=parsed_request_id).update(
+        status="error", error_message=message, metrics_json={"timings": timings}
+    )
+    ParsedRequest.objects.filter(request_id=parsed_request_id).update(status="ERROR")
+
+
+@shared_task(bind=True)
+def run_deforestation_job(self, lat, lon, location_id, parsed_request_id=None):
+    """
+    Downloads the before/after composites concurrently (io queue), runs
+    change detection (inference queue) and records status, timings and paths
+    on the DeforestationRun of `parsed_request_id` (when given). This task
+    is replaced by the chain, so its result is the mask path.
+    """
+    if parsed_request_id is not None:
+        DeforestationRun.objects.update_or_create(
+            parsed_request_id=parsed_request_id,
+            defaults={"status": "processing", "error_message": None},
+        )
+        ParsedRequest.objects.filter(request_id=parsed_request_id).update(status="PROCESSING")
+
+    workflow = chain(
+        download_deforestation_pair.s(lat, lon, location_id, parsed_request_id),
+        infer_deforestation_mask.s(location_id, parsed_request_id),
+    )
+    return self.replace(workflow)
+
+
+@shared_task(acks_late=True)
+def download_deforestation_pair(lat, lon, location_id, parsed_request_id=None):
+    timings = {}
+    step = time.perf_counter()
+    try:
+        before, after = download_pair(lat, lon, location_id, timings=timings)
+    finally:
+        timings["download_s"] = round(time.perf_counter() - step, 2)
+
+    if before is None or after is None:
+        message = "Imagery download failed for one or both epochs"
+        _fail_deforestation_run(parsed_request_id, message, timings)
+        raise RuntimeError(message)
+
+    return {"before": before, "after": after, "timings": timings}
+
+
+@shared_task(acks_late=True)
+def infer_deforestation_mask(pair, location_id, parsed_request_id=None):
+    timings = pair["timings"]
+    step = time.perf_counter()
+    try:
+        mask_path = generate_deforestation_mask(pair["before"], pair["after"], location_id)
+    except Exception as e:
+        timings["inference_s"] = round(time.perf_counter() - step, 2)
+        _fail_deforestation_run(parsed_request_id, str(e), timings)
+        raise
+    timings["inference_s"] = round(time.perf_counter() - step, 2)
+
+    if parsed_request_id is not None:
+        DeforestationRun.objects.filter(parsed_request_id=parsed_request_id).update(
+            before_image_path=pair["before"],
+            after_image_path=pair["after"],
+            mask_path=mask_path,
+            metrics_json={"timings": timings},
+            model_version=Path(DEFORESTATION_MODEL_PATH).stem,
+            status="done",
+        )
+        ParsedRequest.objects.filter(request_id=parsed_request_id).update(
+            status="FINISHED", completed_at=timezone.now()
+        )
+
+    return str(mask_path)
+
+
+def _report_lulc_progress(study_id, year, status):
+    """
+    Pushes a short status string onto the year result. The study itself
+    stays "running" (or "error") until _complete_lulc_year closes it.
+    """
+    if study_id is None:
+        return
+    status = status[:20]
+    LULCYearResult.objects.filter(study_id=study_id, year=year).update(status=status)
+    if status == "error":
+        LULCStudy.objects.filter(id=study_id).update(status="error")
+    else:
+        LULCStudy.objects.filter(id=study_id).exclude(status="error").update(status="running")
+
+
+@shared_task(acks_late=True)
+def download_lulc_tile(tile_lat, tile_lon, year, tile_location_id, aoi_bbox):
+    """Downloads one tile; existing/cached composites make reruns free."""
+    path = download_tile(tile_lat, tile_lon, year, tile_location_id, aoi_bbox)
+    return str(path) if path else None
+
+
+@shared_task(acks_late=True)
+def infer_lulc_tile(image_path, year, tile_location_id, location_id, total, study_id=None):
+    """
+    Runs inference for one downloaded tile and returns its image/mask pair.
+    A mask that already exists is reused, so a re-delivered task resumes
+    instead of recomputing. A tile whose download failed comes back with no
+    image or mask, so the chord body can record it as missing.
+    """
+    if image_path is None:
+        return {"tile": tile_location_id, "image": None, "mask": None}
 
-#@shared_task
-#def run_deforestation_job(lat, lon, location_id):
-    #img_path = download_large_area(lat,lon,location_id)
-    #inference_path = run_inference_on_tiles(img_path,location_id)
-    #mask_path = stitch_masks(inference_path, location_id)
-    #output_path = save_colored_mask(mask_path,location_id)
-    #sat_path = stitch_images(img_path,2021,location_id)
+    mask_path = lulc_mask_path(image_path, year, tile_location_id)
+    if not mask_path.exists():
+        mask_path = run_lulc_inference(image_path, year, tile_location_id)
 
+    done = sum(
+        lulc_mask_path(None, year, f"{location_id}{i}").exists()
+        for i in range(1, total + 1)
+    )
+    _report_lulc_progress(study_id, year, f"tiles {done}/{total}")
+    return {"tile": tile_location_id, "image": str(image_path), "mask": str(mask_path)}
 
-    #image_path = LULC_Temp_Downloader(lat,lon,location_id)
-    #result_path = run_lulc_inference(image_path, location_id)
-    #mask_path = save_colored_mask(result_path, location_id)
 
+# "partial": finished, but some tiles failed to download (see metrics_json["missing_tiles"])
+FINISHED_YEAR_STATUSES = ("done", "partial")
 
 
+def _previous_lulc_year(study_id, year):
+    """
+    The study's year just before `year`, if it is already done with its
+    mask on disk, so this year can be stitched against it.
+    """
+    if study_id is None:
+        return None
+    previous = LULCYearResult.objects.filter(study_id=study_id, year__lt=year).order_by("-year").first()
+    if previous is None or previous.status not in FINISHED_YEAR_STATUSES or not Path(previous.mask_path).exists():
+        return None
+    return previous
+
+
+def _complete_lulc_year(study_id, year, image_path, mask_path, year_metrics, status="done"):
+    """
+    Marks one year finished ("done" or "partial"). Finishers are serialised on the study row only to
+    decide which of them is last; that one concludes the study after the
+    lock is released.
+    """
+    with transaction.atomic():
+        LULCStudy.objects.select_for_update().get(id=study_id)
+        updated = LULCYearResult.objects.filter(study_id=study_id, year=year).update(
+            image_path=str(image_path), mask_path=str(mask_path),
+            metrics_json=year_metrics, status=status,
+        )
+        statuses = list(LULCYearResult.objects.filter(study_id=study_id).values_list("status", flat=True))
+
+    # A year without a row (not started by run_LULC_job) never concludes the study
+    if updated and all(s in FINISHED_YEAR_STATUSES for s in statuses):
+        _conclude_lulc_study(study_id)
+
+
+def _conclude_lulc_study(study_id):
+    """
+    Writes the per-year class areas and the transitions between consecutive
+    years to the LULCConclusion and marks the study done, or "partial" when
+    a year is missing tiles (listed under "missing_tiles"). Transitions
+    accumulated at stitch time are reused; only years stitched before their
+    predecessor was done are compared from the stored masks.
+    """
+    results = list(LULCYearResult.objects.filter(study_id=study_id).order_by("year"))
+
+    years = {
+        str(r.year): {c["name"]: c["hectares"] for c in r.metrics_json["classes"]}
+        for r in results if r.metrics_json
+    }
+    missing_tiles = {
+        str(r.year): r.metrics_json["missing_tiles"]
+        for r in results if r.metrics_json and r.metrics_json.get("missing_tiles")
+    }
+    transitions = {}
+    for before, after in zip(results, results[1:]):
+        stitched = (after.metrics_json or {}).get("transition")
+        if stitched and stitched["from_year"] == before.year:
+            transitions[f"{before.year}->{after.year}"] = stitched
+        elif Path(before.mask_path).exists() and Path(after.mask_path).exists():
+            matrix = compute_stats(after.mask_path, reference=before.mask_path).transitions_dict()
+            transitions[f"{before.year}->{after.year}"] = {
+                "from_year": before.year, "to_year": after.year, **matrix
+            }
+
+    with transaction.atomic():
+        conclusion, _ = LULCConclusion.objects.select_for_update().get_or_create(study_id=study_id)
+        metrics = conclusion.metrics_json or {}
+        metrics["years"] = years
+        metrics["transitions"] = transitions
+        metrics["missing_tiles"] = missing_tiles
+        conclusion.metrics_json = metrics
+        conclusion.save(update_fields=["metrics_json"])
+
+    status = "partial" if missing_tiles else "done"
+    LULCStudy.objects.filter(id=study_id).exclude(status="error").update(status=status)
 
-    #before, after = download_pair(lat, lon, location_id)
-    #result_path = generate_deforestation_mask(before,after,location_id)
-    #return str(output_path)
 
 @shared_task
-def run_LULC_job(lat,lon,radius,year,location_id):
-    img_path = download_large_area(lat,lon,radius,year,location_id)
-    inference_path = run_inference_on_tiles(img_path,year,location_id)
-    mask_path = stitch_masks(inference_path,year,location_id)
+def finish_LULC_job(tile_results, year, location_id, study_id=None):
+    """
+    Chord body: stitches the per-tile masks/images and colourises the mask.
+    Class areas, and the transition from the previous year when that one is
+    already done, are accumulated while the mask is stitched and stored in
+    metrics_json; the study is concluded once every year has finished.
+
+    Tiles that failed to download are listed in metrics_json["missing_tiles"]
+    and the year is marked "partial", since its areas cover only part of
+    the AOI.
+    """
+    missing = [r["tile"] for r in tile_results if not r["mask"]]
+    tile_results = [r for r in tile_results if r["mask"]]
+    if not tile_results:
+        _report_lulc_progress(study_id, year, "error")
+        raise RuntimeError(f"No LULC tiles succeeded for {location_id} ({year})")
+
+    _report_lulc_progress(study_id, year, "stitching")
+
+    previous = _previous_lulc_year(study_id, year)
+    stats = ClassStats(reference=previous.mask_path if previous else None)
+    try:
+        mask_path = stitch_masks([r["mask"] for r in tile_results],year,location_id, stats=stats)
+    finally:
+        stats.close()
     output_path = save_colored_mask(mask_path,year,location_id)
-    sat_path = stitch_images(img_path,year,location_id)
+    sat_path = stitch_images([r["image"] for r in tile_results],year,location_id)
+
+    if missing:
+        print(f"⚠️ {len(missing)} LULC tiles missing for {location_id} ({year}): {', '.join(missing)}")
+
+    if study_id is not None:
+        year_metrics = stats.to_dict()
+        year_metrics["missing_tiles"] = missing
+        if previous is not None:
+            year_metrics["transition"] = {
+                "from_year": previous.year, "to_year": year, **stats.transitions_dict()
+            }
+        _complete_lulc_year(study_id, year, sat_path, mask_path, year_metrics,
+                            status="partial" if missing else "done")
+
     return str(output_path),str(sat_path)
+
+
+@shared_task(bind=True)
+def run_LULC_job(self,lat,lon,radius,year,location_id,study_id=None):
+    """
+    Fans the request out as one download -> inference chain per tile and
+    joins them in a chord that stitches and colourises. This task is
+    replaced by the chord, so its result is the chord's result.
+    """
+    if study_id is not None:
+        # The study is only concluded once every one of its year rows is done
+        LULCYearResult.objects.get_or_create(
+            study_id=study_id, year=year, defaults={"image_path": "", "mask_path": ""}
+        )
+
+    tiles, aoi_bbox = plan_tiles(lat, lon, radius, location_id)
+    total = len(tiles)
+    _report_lulc_progress(study_id, year, f"tiles 0/{total}")
+
+    header = [
+        chain(
+            download_lulc_tile.s(tile_lat, tile_lon, year, tile_location_id, aoi_bbox),
+            infer_lulc_tile.s(year, tile_location_id, location_id, total, study_id),
+        )
+        for tile_lat, tile_lon, tile_location_id in tiles
+    ]
+    workflow = chord(header, finish_LULC_job.s(year, location_id, study_id))
+    return self.replace(workflow)
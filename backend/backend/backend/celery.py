@@ -1,6 +1,7 @@
 from __future__ import absolute_import, unicode_literals
 import os
 from celery import Celery
+from celery.signals import celeryd_init, worker_process_init
 
 # tell Celery where your Django settings are
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
@@ -12,3 +13,45 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 
 # auto-discover tasks in your apps
 app.autodiscover_tasks()
+
+# queues this worker consumes; set in the parent before the pool forks
+WORKER_QUEUES = set()
+
+
+@celeryd_init.connect
+def configure_queue_worker(sender=None, conf=None, options=None, **kwargs):
+    """Applies WORKER_QUEUE_OPTIONS for workers started with a single -Q queue."""
+    from django.conf import settings
+
+    queues = (options or {}).get("queues") or []
+    if isinstance(queues, str):
+        queues = queues.split(",")
+    # Without -Q the worker consumes every declared queue
+    if not queues:
+        queues = [queue.name for queue in settings.CELERY_TASK_QUEUES]
+    WORKER_QUEUES.update(q.strip() for q in queues)
+
+    if len(WORKER_QUEUES) == 1:
+        queue_options = settings.WORKER_QUEUE_OPTIONS.get(next(iter(WORKER_QUEUES)), {})
+        if "concurrency" in queue_options:
+            conf.worker_concurrency = queue_options["concurrency"]
+        if "prefetch_multiplier" in queue_options:
+            conf.worker_prefetch_multiplier = queue_options["prefetch_multiplier"]
+
+
+@worker_process_init.connect
+def preload_inference_models(**kwargs):
+    """
+    Loads, optimises and warms up both models when a pool process starts on
+    an inference worker, so the first task does not pay for it.
+    """
+    if "inference" not in WORKER_QUEUES:
+        return
+
+    # Importing the inference modules registers their models
+    import processing.LULC_inference  # noqa: F401
+    import processing.inference  # noqa: F401
+    from processing import model_registry
+
+    model_registry.load_all()
+    print(f"Inference models warmed up: {model_registry.timings()}")
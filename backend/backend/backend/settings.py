@@ -15,6 +15,8 @@ from decouple import config
 from datetime import timedelta
 import os
 
+from kombu import Queue
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -50,6 +52,7 @@ INSTALLED_APPS = [
     "queries",
     "deforestation",
     "lulc",
+    "tiles",
 ]
 
 REST_FRAMEWORK = {
@@ -86,6 +89,35 @@ CORS_ALLOW_CREDENTIALS = True
 CELERY_BROKER_URL = "redis://ali-IdeaPad-Slim-3-15ABR8:6379/0"
 CELERY_RESULT_BACKEND = "redis://ali-IdeaPad-Slim-3-15ABR8:6379/1"
 
+# Task queues: STAC/dask downloads (io), TorchScript inference (inference)
+# and orchestration/stitching/colourising (postprocess). A plain
+# `celery -A backend worker` consumes all three. In production run one
+# worker per queue so downloads never hold the inference slots, e.g.
+#   celery -A backend worker -Q io -n io@%h
+#   celery -A backend worker -Q inference -n inference@%h
+#   celery -A backend worker -Q postprocess -n postprocess@%h
+CELERY_TASK_QUEUES = (
+    Queue("io"),
+    Queue("inference"),
+    Queue("postprocess"),
+)
+CELERY_TASK_DEFAULT_QUEUE = "postprocess"
+CELERY_TASK_ROUTES = {
+    "accounts.tasks.download_lulc_tile": {"queue": "io"},
+    "accounts.tasks.download_deforestation_pair": {"queue": "io"},
+    "accounts.tasks.infer_lulc_tile": {"queue": "inference"},
+    "accounts.tasks.infer_deforestation_mask": {"queue": "inference"},
+}
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+
+# Per-queue worker defaults, applied when a worker consumes a single queue
+# (command-line -c / --prefetch-multiplier still win)
+WORKER_QUEUE_OPTIONS = {
+    "io": {"concurrency": 8, "prefetch_multiplier": 4},
+    "inference": {"concurrency": 1, "prefetch_multiplier": 1},
+    "postprocess": {"concurrency": 2, "prefetch_multiplier": 1},
+}
+
 
 ROOT_URLCONF = 'backend.urls'
 
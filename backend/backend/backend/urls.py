@@ -30,6 +30,7 @@ urlpatterns = [
     path("auth/logout/", LogoutView.as_view(), name="auth_logout"),
     path('api/deforestation/', include('deforestation.urls')),
     path('api/lulc/', include('lulc.urls')),
+    path('api/tiles/', include('tiles.urls')),
 
 ]
 
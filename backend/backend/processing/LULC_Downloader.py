@@ -2,17 +2,19 @@
 # PHASE 1: DOWNLOADER (FIXED)
 # ==========================================
 import os
-import pystac_client
-import planetary_computer
 import stackstac
-import pyproj
 import numpy as np
 import xarray as xr
-from shapely.geometry import box, mapping
-from shapely.ops import transform
+from shapely.geometry import shape
 import rioxarray
 from dask.diagnostics import ProgressBar
 from pathlib import Path
+from processing.stac_search import search_items, filter_items
+from processing.compositing import composite, scl_mask, median_composite, web_mercator_params
+from processing import composite_cache
+from processing.palette import ESA_LUT, remap
+from processing.reflectance import STORAGE, write_composite
+from processing.cog import partial_path, to_cog
 
 OUTPUT_BASE = Path("./data")
 OUTPUT_BEFORE = OUTPUT_BASE / "LULC_Before"
@@ -20,50 +22,53 @@ OUTPUT_AFTER = OUTPUT_BASE / "LULC_After"
 OUTPUT_BEFORE.mkdir(parents=True, exist_ok=True)
 OUTPUT_AFTER.mkdir(parents=True, exist_ok=True)
 
+SPECTRAL_ASSETS = ["B02", "B03", "B04", "B05", "B06", "B07", "B08", "B11", "B12"]
+TILE_RADIUS_KM = 3
+
+# Everything that changes the pixels of a composite; part of its cache key
+COMPOSITE_PARAMS = {
+    "collection": "sentinel-2-l2a",
+    "cloud_lt": 20,
+    "resolution": 10,
+    "scl_masked": [0, 1, 3, 8, 9, 10, 11],
+    "reducer": "median",
+    "dtype": STORAGE,
+}
+
 
 def get_3857_params(lat: float, lon: float, radius_km: float):
-    wgs84 = pyproj.CRS("EPSG:4326")
-    web_mercator = pyproj.CRS("EPSG:3857")
-    to_3857 = pyproj.Transformer.from_crs(wgs84, web_mercator, always_xy=True).transform
-    to_wgs = pyproj.Transformer.from_crs(web_mercator, wgs84, always_xy=True).transform
-    x_c, y_c = to_3857(lon, lat)
-    x_c, y_c = round(x_c / 10) * 10, round(y_c / 10) * 10
-    r_m = radius_km * 1000
-    bounds_3857 = (x_c - r_m, y_c - r_m, x_c + r_m, y_c + r_m)
-    wgs_geom = mapping(transform(to_wgs, box(*bounds_3857)))
-    return bounds_3857, wgs_geom
-
-def download_manzar_lulc_data(lat, lon, radius_km, file_path, esa_path, target_year):
+    return web_mercator_params(lat, lon, radius_km)
+
+def search_lulc_items(wgs_bbox, target_year):
+    """Sentinel-2 and ESA WorldCover items for a WGS84 bbox (cached per AOI)."""
+    s2_items = search_items(COMPOSITE_PARAMS["collection"], wgs_bbox,
+                            datetime=f"{target_year}-01-01/{target_year}-12-31",
+                            cloud_lt=COMPOSITE_PARAMS["cloud_lt"])
+    esa_items = search_items("esa-worldcover", wgs_bbox)
+    return s2_items, esa_items
+
+def download_manzar_lulc_data(lat, lon, radius_km, file_path, esa_path, target_year, s2_items=None, esa_items=None):
     print(f"\n🚀 PHASE 1: Full-Spectrum Processing")
     bounds_3857, wgs_geom = get_3857_params(lat, lon, radius_km)
-    catalog = pystac_client.Client.open("https://planetarycomputer.microsoft.com/api/stac/v1", modifier=planetary_computer.sign_inplace)
 
-    # 1. Search
-    s2_search = catalog.search(collections=["sentinel-2-l2a"], intersects=wgs_geom, 
-                               datetime=f"{target_year}-01-01/{target_year}-12-31", query={"eo:cloud_cover": {"lt": 20}})
-    s2_items = list(s2_search.items())
-    
-    esa_search = catalog.search(collections=["esa-worldcover"], intersects=wgs_geom)
-    esa_items = list(esa_search.items())
+    # 1. Search (or reuse the AOI-wide search) and keep items touching this tile
+    if s2_items is None or esa_items is None:
+        s2_items, esa_items = search_lulc_items(shape(wgs_geom).bounds, target_year)
+    s2_items = filter_items(s2_items, wgs_geom)
+    esa_items = filter_items(esa_items, wgs_geom)
     
     if not s2_items or not esa_items:
         print("❌ Data not found.")
         return None, None
 
-    # 2. Stack (FIXED TYPES)
-    spectral_assets = ["B02", "B03", "B04", "B05", "B06", "B07", "B08", "B11", "B12"]
-    
-    s2_stack = stackstac.stack(
-        s2_items, 
-        assets=spectral_assets + ["SCL"], 
-        bounds=bounds_3857,
-        epsg=3857, 
-        resolution=10, 
-        dtype="float32", 
-        fill_value=np.float32(np.nan), # FIX: Explicit 32-bit NaN
-        rescale=False
+    # 2. Composite (shared engine: SCL mask, baseline offset, median)
+    final_img = composite(
+        s2_items, SPECTRAL_ASSETS, bounds_3857, 3857,
+        resolution=COMPOSITE_PARAMS["resolution"],
+        masking=scl_mask(COMPOSITE_PARAMS["scl_masked"]),
+        compositing=median_composite,
     )
-    
+
     esa_stack = stackstac.stack(
         esa_items, 
         assets=["map"], 
@@ -75,56 +80,69 @@ def download_manzar_lulc_data(lat, lon, radius_km, file_path, esa_path, target_y
         rescale=False
     )
 
-    # 3. Process
-    offsets = [1000.0 if float(str(item.properties.get("s2:processing_baseline", "0.0"))) >= 4.0 else 0.0 for item in s2_items]
-    offset_da = xr.DataArray(offsets, coords={'time': s2_stack.time}, dims=['time'])
-    
-    scl_mask = s2_stack.sel(band="SCL").isin([0, 1, 3, 8, 9, 10, 11])
-    clean_s2 = ((s2_stack.sel(band=spectral_assets).where(~scl_mask) - offset_da) / 10000.0).clip(0, 1)
-
+    # 3. Reference mask
     with ProgressBar():
-        final_img = clean_s2.median(dim="time", skipna=True).compute()
         final_mask = esa_stack.sel(band="map").isel(time=0).compute() # FIX: .isel instead of .first
 
     # 4. Remap & Save
-    # Mapping Strategy defined in the Strategic Framework
-    mapping_dict = {
-        10: 0,  # Tree cover
-        20: 1,  # Shrubland
-        30: 2,  # Grassland
-        40: 3,  # Cropland
-        50: 4,  # Built-up
-        60: 5,  # Bare / Sparse
-        80: 6,  # Permanent Water
-        95: 7   # Mangroves
-    }
-    remapped_mask = np.full(final_mask.shape, 255, dtype=np.uint8)
-    for esa_val, model_idx in mapping_dict.items():
-        remapped_mask[final_mask.values == esa_val] = model_idx
+    # Mapping Strategy defined in the Strategic Framework (processing/palette.py)
+    remapped_mask = remap(final_mask.values, ESA_LUT)
 
     
     # Save Image with Band Names for Phase 2
-    final_img.rio.to_raster(file_path, compress="LZW", tiled=True)
+    write_composite(final_img, file_path, compress="LZW", tiled=True)
     mask_xr = xr.DataArray(remapped_mask, coords=final_mask.coords, dims=final_mask.dims)
-    mask_xr.rio.write_crs("EPSG:3857", inplace=True).rio.to_raster(esa_path, compress="LZW", dtype="uint8")
+    esa_tmp = partial_path(esa_path)
+    mask_xr.rio.write_crs("EPSG:3857", inplace=True).rio.to_raster(esa_tmp, compress="LZW", dtype="uint8")
+    to_cog(esa_tmp, esa_path, categorical=True)
+
+def _composite_cache_key(lat, lon, year):
+    """(cell, key): composites are shared across requests by grid cell, not location_id."""
+    bounds_3857, _ = get_3857_params(lat, lon, TILE_RADIUS_KM)
+    cell = composite_cache.grid_cell(bounds_3857)
+    return cell, composite_cache.composite_key(cell, year, SPECTRAL_ASSETS, COMPOSITE_PARAMS)
+
 
-def LULC_Image_Downloader(lat,lon,year,location_id):
+def cached_composite(lat, lon, year, location_id):
+    """
+    The tile's composite if it is already on disk or in the composite
+    cache, else None. Needs no STAC search, so callers check it first.
+    """
+    file_path = OUTPUT_AFTER / f"{location_id}_{year}.tif"
+
+    if file_path.exists():
+        print("Already Exists, passing for inference")
+        return file_path
+
+    cell, cache_key = _composite_cache_key(lat, lon, year)
+    if composite_cache.fetch(cache_key, file_path):
+        print(f"Composite cache hit for cell {cell}, skipping download")
+        return str(file_path)
+
+    return None
+
+
+def LULC_Image_Downloader(lat,lon,year,location_id,s2_items=None,esa_items=None):
     print("Starting Image Acquistion process:\n")
 
     fileName = f"{location_id}_{year}.tif"
     file_path = OUTPUT_AFTER / fileName
     esa_path = f"{location_id}_ESA_{year}.tif"
 
-    if file_path.exists():
-        print("Already Exists, passing for inference")
-        return file_path
+    cached = cached_composite(lat, lon, year, location_id)
+    if cached is not None:
+        return cached
+
+    cell, cache_key = _composite_cache_key(lat, lon, year)
 
     try:
-        download_manzar_lulc_data(lat, lon, radius_km=3, file_path=file_path, esa_path=esa_path, target_year=year)
+        download_manzar_lulc_data(lat, lon, radius_km=TILE_RADIUS_KM, file_path=file_path, esa_path=esa_path, target_year=year,
+                                  s2_items=s2_items, esa_items=esa_items)
     except Exception as errorInfo:
         print(f"❌ Failed {location_id}: {errorInfo}")
     
     if file_path.exists():
+        composite_cache.store(cache_key, file_path, cell, year, COMPOSITE_PARAMS)
         return str(file_path)
     
     return None
@@ -1,17 +1,45 @@
 import math
+import time
 import pyproj
-from processing.LULC_Downloader import LULC_Image_Downloader
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from decouple import config
+from processing.LULC_Downloader import LULC_Image_Downloader, cached_composite, search_lulc_items
 
 TILE_RADIUS_KM = 3.0          # fixed constraint
 TILE_SIZE_M = TILE_RADIUS_KM * 2000  # 6km squares
 
+# Tiles are network/dask bound, so a small thread pool overlaps them well
+DOWNLOAD_WORKERS = config("LULC_DOWNLOAD_WORKERS", default=4, cast=int)
+TILE_RETRIES = config("LULC_TILE_RETRIES", default=3, cast=int)
+RETRY_BACKOFF_S = 2.0
 
-def download_large_area(lat, lon, radius_km, year, location_id):
+
+def _download_tile(tile_lat, tile_lon, year, tile_location_id, s2_items=None, esa_items=None):
     """
-    Splits request into 3km-radius tiles (6x6km squares)
-    and calls download_fn(tile_lat, tile_lon, 3).
+    Downloads one tile, retrying with exponential backoff.
+    LULC_Image_Downloader reports failure by returning None.
+    """
+    for attempt in range(1, TILE_RETRIES + 1):
+        result = LULC_Image_Downloader(tile_lat, tile_lon, year, tile_location_id, s2_items, esa_items)
+        if result is not None:
+            return result
+
+        if attempt < TILE_RETRIES:
+            delay = RETRY_BACKOFF_S * 2 ** (attempt - 1)
+            print(f"⚠️ Tile {tile_location_id} failed (attempt {attempt}/{TILE_RETRIES}), retrying in {delay:.0f}s")
+            time.sleep(delay)
 
-    Returns list of results from each download.
+    print(f"❌ Tile {tile_location_id} failed after {TILE_RETRIES} attempts")
+    return None
+
+
+def plan_tiles(lat, lon, radius_km, location_id):
+    """
+    Splits request into 3km-radius tiles (6x6km squares) on the canonical grid.
+
+    Returns (tiles, aoi_bbox): tiles is a list of
+    (tile_lat, tile_lon, tile_location_id) in grid order and aoi_bbox the
+    WGS84 bbox of the whole grid, used for the shared STAC search.
     """
 
     to_3857 = pyproj.Transformer.from_crs(
@@ -25,9 +53,11 @@ def download_large_area(lat, lon, radius_km, year, location_id):
 
     request_radius_m = radius_km * 1000
 
-    minx = cx - request_radius_m
+    # Snap the grid origin to multiples of the tile size so tiles from any
+    # request land on the same canonical cells (and composite cache keys)
+    minx = math.floor((cx - request_radius_m) / TILE_SIZE_M) * TILE_SIZE_M
     maxx = cx + request_radius_m
-    miny = cy - request_radius_m
+    miny = math.floor((cy - request_radius_m) / TILE_SIZE_M) * TILE_SIZE_M
     maxy = cy + request_radius_m
 
     # ROUND UP happens here
@@ -36,7 +66,7 @@ def download_large_area(lat, lon, radius_km, year, location_id):
 
     print(f"{nx} x {ny} grid → {nx*ny} tiles")
 
-    results = []
+    tiles = []
     tile_count = 0
     for i in range(nx):
         for j in range(ny):
@@ -46,14 +76,66 @@ def download_large_area(lat, lon, radius_km, year, location_id):
             tile_location_id = location_id + str(tile_count)
 
             tile_lon, tile_lat = to_4326.transform(tx, ty)
+            tiles.append((tile_lat, tile_lon, tile_location_id))
+
+    # Grid extent plus a small margin for the 10m snapping of tile centres
+    margin = 100
+    west, south = to_4326.transform(minx - margin, miny - margin)
+    east, north = to_4326.transform(minx + nx * TILE_SIZE_M + margin, miny + ny * TILE_SIZE_M + margin)
+
+    return tiles, (west, south, east, north)
+
+
+def download_tile(tile_lat, tile_lon, year, tile_location_id, aoi_bbox):
+    """
+    Downloads one tile of a planned grid on its own (e.g. from a per-tile
+    Celery task). Cached composites are returned before any catalog search;
+    the AOI search is TTL-cached, so the tiles of one job that land on the
+    same worker share a single catalog round-trip.
+    """
+    cached = cached_composite(tile_lat, tile_lon, year, tile_location_id)
+    if cached is not None:
+        return cached
+
+    s2_items, esa_items = search_lulc_items(aoi_bbox, year)
+    return _download_tile(tile_lat, tile_lon, year, tile_location_id, s2_items, esa_items)
+
+
+def download_large_area(lat, lon, radius_km, year, location_id, progress_cb=None, max_workers=None):
+    """
+    Splits request into 3km-radius tiles (6x6km squares)
+    and downloads them concurrently on a bounded thread pool.
+
+    The STAC catalog is searched once for the whole grid; each tile only
+    filters that shared item list down to its own footprint.
+
+    progress_cb(done, total) is called from the calling thread each time
+    a tile finishes, so it may safely touch the database.
+
+    Returns list of results from each download, in grid order.
+    """
+
+    tiles, aoi_bbox = plan_tiles(lat, lon, radius_km, location_id)
+
+    # One search for the full grid instead of one per tile
+    s2_items, esa_items = search_lulc_items(aoi_bbox, year)
+    print(f"AOI search: {len(s2_items)} Sentinel-2 / {len(esa_items)} WorldCover items")
 
-            result = LULC_Image_Downloader(
-                tile_lat,
-                tile_lon,
-                year,
-                tile_location_id
-            )
+    total = len(tiles)
+    results = [None] * total
+    done = 0
+    workers = max(1, min(max_workers or DOWNLOAD_WORKERS, total))
 
-            results.append(result)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(_download_tile, tile_lat, tile_lon, year, tile_location_id, s2_items, esa_items): idx
+            for idx, (tile_lat, tile_lon, tile_location_id) in enumerate(tiles)
+        }
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+            done = done + 1
+            print(f"Tile {done}/{total} finished")
+            if progress_cb is not None:
+                progress_cb(done, total)
 
     return results
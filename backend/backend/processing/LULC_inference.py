@@ -5,6 +5,18 @@ import numpy as np
 import torch
 import rasterio
 from pathlib import Path
+from decouple import config
+
+try:  # optional: fuses each index into a single multithreaded pass
+    import numexpr as ne
+except ImportError:
+    ne = None
+
+from processing.tiling import iter_blocks, halo_window, gaussian_weights
+from processing.palette import colormap
+from processing import model_registry
+from processing.reflectance import read_reflectance
+from processing.cog import partial_path, to_cog
 
 # ==========================================
 # CONFIG
@@ -15,6 +27,14 @@ IN_CHANNELS = 14
 PATCH_SIZE = 512
 OVERLAP = 0.5
 
+# Windows per forward pass. Set per worker through the environment so
+# CPU-only workers and GPU workers can size batches to their own memory.
+BATCH_SIZE = config("LULC_BATCH_SIZE", default=8, cast=int)
+
+# Core block edge (pixels) for streaming inference. Kept a multiple of the
+# window stride so every block sees the same window grid as a full-image pass.
+STREAM_BLOCK_SIZE = config("LULC_STREAM_BLOCK_SIZE", default=1536, cast=int)
+
 BASE_DIR = Path(__file__).resolve().parent / "models"
 MODEL_PT_PATH = BASE_DIR / "manzar_lulc_try_1.pt"
 
@@ -24,7 +44,9 @@ OUTPUT_MASK.mkdir(parents=True, exist_ok=True)
 
 DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
-_MODEL = None   # cached singleton
+model_registry.register(
+    "lulc", MODEL_PT_PATH, DEVICE, (BATCH_SIZE, IN_CHANNELS, PATCH_SIZE, PATCH_SIZE)
+)
 
 
 # ==========================================
@@ -32,50 +54,108 @@ _MODEL = None   # cached singleton
 # ==========================================
 
 def _load_model():
-    global _MODEL
-    if _MODEL is None:
-        print(f"Loading TorchScript model from: {MODEL_PT_PATH}")
-        _MODEL = torch.jit.load(MODEL_PT_PATH, map_location=DEVICE)
-        _MODEL.eval()
-    return _MODEL
+    """Frozen, channels_last, warmed-up model from the process-wide registry."""
+    return model_registry.get_model("lulc")
 
 
 # ==========================================
 # FEATURE ENGINEERING
 # ==========================================
 
-def _compute_indices(img):
-    img = img.astype(np.float32)
+EPS = 1e-8
 
-    b2, b3, b4, b5, b6, b7, b8, b11, b12 = img
-    eps = 1e-8
+# (output plane, a, b) for the normalized differences (a - b) / (a + b + eps),
+# with band positions B02=0 B03=1 B04=2 B05=3 B06=4 B07=5 B08=6 B11=7 B12=8
+_ND_INDICES = [
+    (9, 6, 2),   # NDVI (B08, B04)
+    (10, 1, 6),  # NDWI (B03, B08)
+    (11, 6, 7),  # NDMI (B08, B11)
+    (12, 1, 7),  # NDSI (B03, B11)
+]
 
-    ndvi = (b8 - b4) / (b8 + b4 + eps)
-    ndwi = (b3 - b8) / (b3 + b8 + eps)
-    ndmi = (b8 - b11) / (b8 + b11 + eps)
-    ndsi = (b3 - b11) / (b3 + b11 + eps)
 
-    re_num = ((b4 + b7) / 2) - b5
-    re_denom = b6 - b5 + eps
-    s2rep = (705.0 + 35.0 * (re_num / re_denom) - 700.0) / 50.0
-    s2rep = np.clip(s2rep, 0, 1)
-
-    features = np.stack([ndvi, ndwi, ndmi, ndsi, s2rep])
-    full = np.concatenate([img, features], axis=0)
-
-    full[:9] = np.clip(full[:9], 0, 1)
-    full[9:13] = np.clip(full[9:13], -1, 1)
-    full[13] = np.clip(full[13], 0, 1)
+def _compute_indices(img, out=None, scratch=None):
+    """
+    Builds the 14-band model input (9 bands + NDVI, NDWI, NDMI, NDSI, S2REP).
 
-    return full
+    Everything is written into `out`, a float32 (14, H, W) buffer that the
+    streaming loop reuses between blocks; `scratch` is one (H, W) temporary.
+    Both are (re)allocated only when missing or of the wrong shape. Indices
+    use the raw bands and all clipping happens in place at the end.
+    """
+    _, H, W = img.shape
+    if out is None or out.shape != (IN_CHANNELS, H, W):
+        out = np.empty((IN_CHANNELS, H, W), dtype=np.float32)
+    if scratch is None or scratch.shape != (H, W):
+        scratch = np.empty((H, W), dtype=np.float32)
+
+    bands = out[:9]
+    np.copyto(bands, img, casting="unsafe")
+    b4, b5, b6, b7 = bands[2], bands[3], bands[4], bands[5]
+    s2rep = out[13]
+
+    if ne is not None:
+        for plane, a, b in _ND_INDICES:
+            ne.evaluate("(a - b) / (a + b + eps)",
+                        local_dict={"a": bands[a], "b": bands[b], "eps": np.float32(EPS)},
+                        out=out[plane], casting="unsafe")
+        ne.evaluate("(705.0 + 35.0 * ((((b4 + b7) / 2) - b5) / (b6 - b5 + eps)) - 700.0) / 50.0",
+                    local_dict={"b4": b4, "b5": b5, "b6": b6, "b7": b7, "eps": np.float32(EPS)},
+                    out=s2rep, casting="unsafe")
+    else:
+        for plane, a, b in _ND_INDICES:
+            nd = out[plane]
+            np.subtract(bands[a], bands[b], out=nd)
+            np.add(bands[a], bands[b], out=scratch)
+            scratch += EPS
+            nd /= scratch
+
+        # S2REP: (705 + 35 * (((B4 + B7) / 2 - B5) / (B6 - B5 + eps)) - 700) / 50
+        np.add(b4, b7, out=s2rep)
+        s2rep /= 2
+        s2rep -= b5
+        np.subtract(b6, b5, out=scratch)
+        scratch += EPS
+        s2rep /= scratch
+        s2rep *= 35.0
+        s2rep += 705.0
+        s2rep -= 700.0
+        s2rep /= 50.0
+
+    np.clip(out[:9], 0, 1, out=out[:9])
+    np.clip(out[9:13], -1, 1, out=out[9:13])
+    np.clip(s2rep, 0, 1, out=s2rep)
+
+    return out
 
 
 # ==========================================
 # CORE INFERENCE
 # ==========================================
 
-def _predict(full_stack, model):
+def _window_origins(H_pad, W_pad, stride):
+    return [
+        (y, x)
+        for y in range(0, H_pad - PATCH_SIZE + 1, stride)
+        for x in range(0, W_pad - PATCH_SIZE + 1, stride)
+    ]
+
+
+def _predict(full_stack, model, batch_size=BATCH_SIZE):
+    """
+    Sliding-window prediction. Windows are gathered into batches of
+    ``batch_size`` and run through the model in a single forward pass.
+
+    Overlapping windows are blended with a Gaussian weight kernel. Only the
+    argmax is needed and it does not change when a pixel's scores are
+    scaled, so the weighted scores are never normalised (no counts buffer,
+    no division pass). Scores are accumulated in float32 (numpy has no
+    native half-precision arithmetic) in a strip one window tall that rolls
+    down the image: rows above the current window row are final, get their
+    argmax and are dropped from the strip.
+    """
     C, H, W = full_stack.shape
+    batch_size = max(1, int(batch_size))
 
     pad_h = (PATCH_SIZE - H % PATCH_SIZE) % PATCH_SIZE
     pad_w = (PATCH_SIZE - W % PATCH_SIZE) % PATCH_SIZE
@@ -84,21 +164,45 @@ def _predict(full_stack, model):
     H_pad, W_pad = padded.shape[1:]
     stride = int(PATCH_SIZE * (1 - OVERLAP))
 
-    counts = np.zeros((H_pad, W_pad), dtype=np.float32)
-    probs = np.zeros((NUM_CLASSES, H_pad, W_pad), dtype=np.float32)
+    pred = np.empty((H_pad, W_pad), dtype=np.uint8)
+    strip = np.zeros((NUM_CLASSES, PATCH_SIZE, W_pad), dtype=np.float32)
+    strip_top = 0
+
+    def finalize(rows):
+        nonlocal strip_top
+        pred[strip_top:strip_top + rows] = np.argmax(strip[:, :rows], axis=0)
+        strip[:, :PATCH_SIZE - rows] = strip[:, rows:]
+        strip[:, PATCH_SIZE - rows:] = 0
+        strip_top += rows
+
+    origins = _window_origins(H_pad, W_pad, stride)
+    weights = torch.tensor(gaussian_weights(PATCH_SIZE), device=DEVICE)
+
+    # Reused input buffer; pinned when the batch is headed to a GPU
+    batch = torch.empty(
+        (min(batch_size, len(origins)), C, PATCH_SIZE, PATCH_SIZE),
+        dtype=torch.float32,
+        pin_memory=DEVICE.type == "cuda",
+    )
+    batch_np = batch.numpy()
 
     with torch.no_grad():
-        for y in range(0, H_pad - PATCH_SIZE + 1, stride):
-            for x in range(0, W_pad - PATCH_SIZE + 1, stride):
-                patch = padded[:, y:y+PATCH_SIZE, x:x+PATCH_SIZE]
-                tensor = torch.from_numpy(patch).unsqueeze(0).float().to(DEVICE)
-                logits = model(tensor)
-                score = torch.softmax(logits, dim=1).cpu().numpy()[0]
-                probs[:, y:y+PATCH_SIZE, x:x+PATCH_SIZE] += score
-                counts[y:y+PATCH_SIZE, x:x+PATCH_SIZE] += 1
-
-    avg = probs / np.maximum(counts, 1e-6)
-    pred = np.argmax(avg, axis=0).astype(np.uint8)
+        for start in range(0, len(origins), batch_size):
+            chunk = origins[start:start + batch_size]
+            n = len(chunk)
+            for k, (y, x) in enumerate(chunk):
+                batch_np[k] = padded[:, y:y+PATCH_SIZE, x:x+PATCH_SIZE]
+
+            inputs = batch[:n].to(DEVICE, non_blocking=True).contiguous(memory_format=torch.channels_last)
+            logits = model(inputs)
+            scores = (torch.softmax(logits, dim=1) * weights).float().cpu().numpy()
+
+            for k, (y, x) in enumerate(chunk):
+                if y > strip_top:
+                    finalize(y - strip_top)
+                strip[:, :, x:x+PATCH_SIZE] += scores[k]
+
+    finalize(H_pad - strip_top)
     return pred[:H, :W]
 
 
@@ -106,36 +210,67 @@ def _predict(full_stack, model):
 # PUBLIC FUNCTION FOR MANZAR
 # ==========================================
 
-def run_lulc_inference(image_path: str, year, location_id: str | None = None) -> str:
+def lulc_mask_path(image_path: str, year, location_id: str | None = None) -> Path:
+    """Where run_lulc_inference writes the mask for this image/location."""
+    mask_name = f"LULC_{location_id}_{year}MASK.tif" if location_id else Path(image_path).stem + "_LULC_MASK.tif"
+    return OUTPUT_MASK / mask_name
+
+
+def run_lulc_inference(image_path: str, year, location_id: str | None = None,
+                       model=None, output_path=None) -> str:
     """
     Runs LULC inference on a GeoTIFF and saves prediction mask.
+    The raster is processed in blocks (with a halo for window overlap), so
+    peak memory depends on STREAM_BLOCK_SIZE rather than the image size.
 
     Args:
         image_path: path to downloaded Sentinel-2 image
         location_id: optional identifier to name the mask
+        model: optional model to use instead of the registry's "lulc" model
+        output_path: optional mask path overriding the default naming
 
     Returns:
         path to saved mask
     """
 
-    mask_name = f"LULC_{location_id}_{year}MASK.tif" if location_id else Path(image_path).stem + "_LULC_MASK.tif"
-    mask_path = OUTPUT_MASK / mask_name
+    mask_path = Path(output_path) if output_path else lulc_mask_path(image_path, year, location_id)
+    tmp_path = partial_path(mask_path)
 
     print(f"Processing image: {image_path}")
-    model = _load_model()
+    model = _load_model() if model is None else model
     print("Model loaded successfully")
 
+    stride = int(PATCH_SIZE * (1 - OVERLAP))
+    halo = PATCH_SIZE - stride
+    block_size = max(stride, STREAM_BLOCK_SIZE // stride * stride)
+
     with rasterio.open(image_path) as src:
-        img = src.read()
         profile = src.profile.copy()
-
-    full_stack = _compute_indices(img)
-    pred_mask = _predict(full_stack, model)
-    print(f"Prediction complete, saving mask to: {mask_path}")
-
-    profile.update(dtype=rasterio.uint8, count=1, nodata=255)
-
-    with rasterio.open(mask_path, "w", **profile) as dst:
-        dst.write(pred_mask, 1)
-
+        profile.update(
+            dtype=rasterio.uint8, count=1, nodata=255,
+            tiled=True, blockxsize=256, blockysize=256, compress="lzw",
+        )
+        H, W = src.height, src.width
+
+        # Stream blocks: read each core window plus a halo, predict, and
+        # write the core straight into the output so memory stays per-block.
+        # A temporary name keeps a crashed run from leaving a "finished" mask.
+        with rasterio.open(tmp_path, "w", **profile) as dst:
+            dst.write_colormap(1, colormap())
+            full_stack = scratch = None
+            for core in iter_blocks(H, W, block_size):
+                read_window, (r0, c0) = halo_window(core, halo, H, W)
+                img = read_reflectance(src, window=read_window)
+
+                # Buffers are reused across equally sized blocks
+                if scratch is None or scratch.shape != img.shape[1:]:
+                    scratch = np.empty(img.shape[1:], dtype=np.float32)
+                full_stack = _compute_indices(img, out=full_stack, scratch=scratch)
+                pred = _predict(full_stack, model)
+
+                dst.write(pred[r0:r0 + core.height, c0:c0 + core.width], 1, window=core)
+
+    # Categorical COG: no predictor, nearest-neighbour overviews
+    to_cog(tmp_path, mask_path, categorical=True)
+    print(f"Prediction complete, mask saved to: {mask_path}")
     return str(mask_path)
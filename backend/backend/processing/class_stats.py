@@ -0,0 +1,146 @@
+# backend/processing/class_stats.py
+
+import numpy as np
+import rasterio
+from rasterio import windows
+
+from processing.palette import CLASS_NAMES, NUM_CLASSES, NODATA_CLASS
+from processing.tiling import iter_blocks
+
+EARTH_RADIUS_M = 6378137.0
+M2_PER_HA = 10000.0
+
+
+# ==========================================
+# PIXEL AREA
+# ==========================================
+
+def row_area_ha(transform, crs, row_off: int, height: int) -> np.ndarray:
+    """
+    True ground area (ha) of one pixel in each of `height` rows.
+
+    EPSG:3857 stretches both axes by 1/cos(lat), so a pixel's real area is
+    its nominal area times cos^2(lat); with lat = gd(y / R) that factor is
+    1 / cosh^2(y / R). Other (projected, equal-scale) CRSs such as UTM use
+    the nominal pixel area.
+    """
+    pixel_ha = abs(transform.a * transform.e) / M2_PER_HA
+    if crs is None or crs.to_epsg() != 3857:
+        return np.full(height, pixel_ha)
+
+    y = transform.f + (row_off + np.arange(height) + 0.5) * transform.e
+    return pixel_ha / np.cosh(y / EARTH_RADIUS_M) ** 2
+
+
+# ==========================================
+# ACCUMULATOR
+# ==========================================
+
+class ClassStats:
+    """
+    Per-class pixel counts and hectares, accumulated block by block while a
+    mask is being written, so no second pass over the raster is needed.
+
+    With `reference` (an earlier mask of the same AOI) the same blocks are
+    read from it and a from -> to transition matrix is accumulated too.
+    """
+
+    def __init__(self, reference=None, num_classes: int = NUM_CLASSES, nodata: int = NODATA_CLASS):
+        self.num_classes = num_classes
+        self.nodata = nodata
+        self.pixels = np.zeros(num_classes, dtype=np.int64)
+        self.hectares = np.zeros(num_classes, dtype=np.float64)
+        self.nodata_pixels = 0
+        self.crs = None
+
+        self._reference = rasterio.open(reference) if reference else None
+        self.transition_pixels = np.zeros((num_classes, num_classes), dtype=np.int64)
+        self.transition_hectares = np.zeros((num_classes, num_classes), dtype=np.float64)
+
+    def add(self, classes: np.ndarray, window, transform, crs):
+        """Adds one (h, w) block of class ids located at `window` of a raster on `transform`."""
+        h, w = classes.shape
+        self.crs = crs
+        area = row_area_ha(transform, crs, int(window.row_off), h)
+
+        # Per-row histograms over all 256 ids, so the row areas weight them exactly
+        rows = np.bincount(
+            (np.arange(h, dtype=np.int64)[:, None] * 256 + classes).ravel(),
+            minlength=h * 256,
+        ).reshape(h, 256)
+        self.pixels += rows[:, :self.num_classes].sum(axis=0)
+        self.hectares += area @ rows[:, :self.num_classes]
+        self.nodata_pixels += int(rows[:, self.nodata].sum())
+
+        if self._reference is not None:
+            self._add_transitions(classes, window, transform, crs, area)
+
+    def _add_transitions(self, classes, window, transform, crs, area):
+        ref = self._reference
+        if ref.crs != crs:
+            return
+
+        h, w = classes.shape
+        ref_window = windows.from_bounds(
+            *windows.bounds(window, transform), transform=ref.transform
+        ).round_offsets().round_lengths()
+        before = ref.read(1, window=ref_window, out_shape=(h, w),
+                          boundless=True, fill_value=self.nodata)
+
+        valid = (before < self.num_classes) & (classes < self.num_classes)
+        pair = before[valid].astype(np.int64) * self.num_classes + classes[valid]
+        size = self.num_classes ** 2
+        pixel_area = np.broadcast_to(area[:, None], (h, w))[valid]
+
+        self.transition_pixels += np.bincount(pair, minlength=size).reshape(self.num_classes, -1)
+        self.transition_hectares += np.bincount(pair, weights=pixel_area, minlength=size).reshape(self.num_classes, -1)
+
+    def close(self):
+        if self._reference is not None:
+            self._reference.close()
+            self._reference = None
+
+    # ------------------------------------------
+    # Serialisation for metrics_json
+    # ------------------------------------------
+
+    def to_dict(self) -> dict:
+        total_ha = float(self.hectares.sum())
+        return {
+            "crs": self.crs.to_string() if self.crs else None,
+            "total_pixels": int(self.pixels.sum()),
+            "nodata_pixels": int(self.nodata_pixels),
+            "total_hectares": round(total_ha, 2),
+            "classes": [
+                {
+                    "id": i,
+                    "name": CLASS_NAMES[i],
+                    "pixels": int(self.pixels[i]),
+                    "hectares": round(float(self.hectares[i]), 2),
+                    "share": round(float(self.hectares[i]) / total_ha, 4) if total_ha else 0.0,
+                }
+                for i in range(self.num_classes)
+            ],
+        }
+
+    def transitions_dict(self) -> dict:
+        """Transition matrices (rows = earlier year's class, columns = this mask's class)."""
+        changed = self.transition_hectares.sum() - np.trace(self.transition_hectares)
+        return {
+            "classes": CLASS_NAMES[:self.num_classes],
+            "pixels": self.transition_pixels.tolist(),
+            "hectares": np.round(self.transition_hectares, 2).tolist(),
+            "changed_hectares": round(float(changed), 2),
+        }
+
+
+def compute_stats(mask_path, reference=None, block_size: int = 1024) -> ClassStats:
+    """Stats for an existing mask (used when no writing pass is available)."""
+    stats = ClassStats(reference=reference)
+    try:
+        with rasterio.open(mask_path) as src:
+            for block in iter_blocks(src.height, src.width, block_size):
+                stats.add(src.read(1, window=block), block, src.transform, src.crs)
+    finally:
+        stats.close()
+    return stats
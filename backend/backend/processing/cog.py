@@ -0,0 +1,77 @@
+# backend/processing/cog.py
+
+import os
+from pathlib import Path
+
+import numpy as np
+import rasterio
+from rasterio.shutil import copy as raster_copy
+from decouple import config
+
+# DEFLATE is readable everywhere (GDAL, browsers' geotiff.js); ZSTD is
+# faster to write and decode where the GDAL build supports it.
+COG_COMPRESS = config("COG_COMPRESS", default="DEFLATE")
+COG_BLOCKSIZE = config("COG_BLOCKSIZE", default=512, cast=int)
+
+
+# ==========================================
+# CREATION OPTIONS
+# ==========================================
+
+def cog_options(dtype: str, categorical: bool = False) -> dict:
+    """
+    COG driver options for a raster of `dtype`.
+
+    Continuous data gets a predictor (3 = floating point, 2 = horizontal
+    differencing for integers) and averaged overviews. Categorical data
+    (class masks) gets neither: differencing class ids does not compress
+    better and averaging them invents classes, so overviews use nearest.
+    """
+    if categorical:
+        predictor, resampling = "NO", "NEAREST"
+    elif np.issubdtype(np.dtype(dtype), np.floating):
+        predictor, resampling = "3", "AVERAGE"
+    else:
+        predictor, resampling = "2", "AVERAGE"
+
+    return {
+        "driver": "COG",
+        "COMPRESS": COG_COMPRESS,
+        "PREDICTOR": predictor,
+        "OVERVIEW_RESAMPLING": resampling,
+        "BLOCKSIZE": COG_BLOCKSIZE,
+        "BIGTIFF": "IF_SAFER",
+    }
+
+
+# ==========================================
+# CONVERSION
+# ==========================================
+
+def partial_path(path) -> Path:
+    """Temporary sibling to write to before the final COG replaces `path`."""
+    path = Path(path)
+    return path.with_name(path.stem + ".partial.tif")
+
+
+def to_cog(src_path, dst_path=None, categorical: bool = False) -> str:
+    """
+    Rewrites a GeoTIFF as a Cloud-Optimized GeoTIFF with internal overviews.
+    Colour tables, nodata, band descriptions and scales/offsets are copied.
+
+    With dst_path the source is converted and deleted (the usual
+    partial -> final step); without it the file is converted in place.
+    Either way the destination only appears once it is complete.
+    """
+    src_path = Path(src_path)
+    dst_path = Path(dst_path) if dst_path else src_path
+    tmp_path = dst_path.with_name(dst_path.stem + ".cog.tif")
+
+    with rasterio.open(src_path) as src:
+        options = cog_options(src.dtypes[0], categorical)
+
+    raster_copy(src_path, tmp_path, **options)
+    os.replace(tmp_path, dst_path)
+    if src_path != dst_path:
+        src_path.unlink(missing_ok=True)
+    return str(dst_path)
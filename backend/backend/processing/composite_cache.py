@@ -0,0 +1,167 @@
+# backend/processing/composite_cache.py
+
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from decouple import config
+
+OUTPUT_BASE = Path("./data")
+CACHE_DIR = OUTPUT_BASE / "composite_cache"
+CACHE_DIR.mkdir(parents=True, exist_ok=True)
+INDEX_PATH = CACHE_DIR / "index.sqlite3"
+
+CACHE_MAX_BYTES = int(config("COMPOSITE_CACHE_MAX_GB", default=20, cast=float) * 1024 ** 3)
+
+
+# ==========================================
+# INDEX TABLE
+# ==========================================
+
+@contextmanager
+def _index():
+    # One short-lived connection per call: tile threads and worker
+    # processes all share the index, sqlite serialises the writes.
+    conn = sqlite3.connect(INDEX_PATH, timeout=30)
+    try:
+        with conn:
+            _ensure_schema(conn)
+            yield conn
+    finally:
+        conn.close()
+
+
+def _ensure_schema(conn):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS composites (
+            key TEXT PRIMARY KEY,
+            path TEXT NOT NULL,
+            size_bytes INTEGER NOT NULL,
+            cell TEXT NOT NULL,
+            year INTEGER NOT NULL,
+            params TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            last_access REAL NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0
+        )
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS composites_lru ON composites (last_access)")
+
+
+def _link_or_copy(src, dst):
+    """Hard-links src to dst (same filesystem) and falls back to a copy."""
+    dst = Path(dst)
+    if dst.exists():
+        dst.unlink()
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+# ==========================================
+# KEYS
+# ==========================================
+
+def grid_cell(bounds_3857):
+    """
+    Canonical cell for snapped EPSG:3857 bounds: (epsg, cell size, ix, iy).
+    Tiles from download_large_area sit on a fixed grid, so overlapping
+    requests resolve to the same cells.
+    """
+    minx, miny, maxx, _ = bounds_3857
+    size = round(maxx - minx, 3)
+    return (3857, size, round(minx / size, 6), round(miny / size, 6))
+
+
+def composite_key(cell, year, bands, params) -> str:
+    """Content address for a composite: grid cell, year, band set and compositing parameters."""
+    payload = json.dumps(
+        {"cell": list(cell), "year": int(year), "bands": list(bands), "params": params},
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+# ==========================================
+# LOOKUP / STORE
+# ==========================================
+
+def fetch(key: str, dest_path) -> bool:
+    """
+    Materialises a cached composite at dest_path. Returns False on a miss,
+    including when another worker evicts the file before it is linked.
+    """
+    with _index() as conn:
+        row = conn.execute("SELECT path FROM composites WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return False
+
+        cached = Path(row[0])
+        if not cached.exists():
+            conn.execute("DELETE FROM composites WHERE key = ?", (key,))
+            return False
+
+        conn.execute(
+            "UPDATE composites SET last_access = ?, hits = hits + 1 WHERE key = ?",
+            (time.time(), key),
+        )
+
+    try:
+        _link_or_copy(cached, dest_path)
+    except FileNotFoundError:
+        # Evicted by another worker after the index check
+        with _index() as conn:
+            conn.execute("DELETE FROM composites WHERE key = ? AND path = ?", (key, str(cached)))
+        return False
+    return True
+
+
+def store(key: str, src_path, cell, year, params) -> Path:
+    """
+    Adds a freshly computed composite to the cache and evicts least recently
+    used entries until the cache fits in CACHE_MAX_BYTES again.
+    """
+    cached = CACHE_DIR / f"{key}.tif"
+    _link_or_copy(src_path, cached)
+
+    now = time.time()
+    with _index() as conn:
+        conn.execute(
+            """
+            INSERT OR REPLACE INTO composites
+                (key, path, size_bytes, cell, year, params, created_at, last_access, hits)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)
+            """,
+            (key, str(cached), cached.stat().st_size, json.dumps(list(cell)),
+             int(year), json.dumps(params, sort_keys=True), now, now),
+        )
+        _evict(conn, keep=key)
+
+    return cached
+
+
+def _evict(conn, keep: str):
+    total = conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM composites").fetchone()[0]
+    if total <= CACHE_MAX_BYTES:
+        return
+
+    rows = conn.execute(
+        "SELECT key, path, size_bytes FROM composites WHERE key != ? ORDER BY last_access ASC",
+        (keep,),
+    ).fetchall()
+
+    for key, path, size in rows:
+        if total <= CACHE_MAX_BYTES:
+            break
+        # Callers hold hard links of their own, so dropping the cache copy is safe
+        Path(path).unlink(missing_ok=True)
+        conn.execute("DELETE FROM composites WHERE key = ?", (key,))
+        total -= size
+        print(f"Composite cache evicted {key[:12]} ({size / 1024 ** 2:.1f} MB)")
@@ -0,0 +1,158 @@
+# backend/processing/compositing.py
+
+import numpy as np
+import pyproj
+import stackstac
+import xarray as xr
+from dask.diagnostics import ProgressBar
+from scipy.ndimage import binary_dilation
+from shapely.geometry import box, mapping
+from shapely.ops import transform
+
+# Sentinel-2 L2A digital numbers -> surface reflectance
+REFLECTANCE_SCALE = np.float32(10000.0)
+# Processing baseline 04.00+ adds this to every DN (BOA_ADD_OFFSET)
+BASELINE_OFFSET = np.float32(1000.0)
+
+# SCL classes treated as invalid: no data, saturated, cloud shadow,
+# cloud medium/high probability, thin cirrus, snow
+DEFAULT_SCL_MASKED = [0, 1, 3, 8, 9, 10, 11]
+
+# Spatial dask chunk for every stack, so all pipelines stream the same way
+CHUNKSIZE = 1024
+
+
+# ==========================================
+# GRID ALIGNMENT
+# ==========================================
+
+def _aoi(lat, lon, radius_km, epsg, snap):
+    to_crs = pyproj.Transformer.from_crs("EPSG:4326", f"EPSG:{epsg}", always_xy=True).transform
+    to_wgs = pyproj.Transformer.from_crs(f"EPSG:{epsg}", "EPSG:4326", always_xy=True).transform
+    x_c, y_c = to_crs(lon, lat)
+    if snap:
+        x_c, y_c = round(x_c / snap) * snap, round(y_c / snap) * snap
+    r_m = radius_km * 1000
+    bounds = (x_c - r_m, y_c - r_m, x_c + r_m, y_c + r_m)
+    wgs_geom = mapping(transform(to_wgs, box(*bounds)))
+    return bounds, wgs_geom
+
+
+def utm_params(lat: float, lon: float, radius_km: float, snap: float = 10):
+    """
+    Square AOI in the point's UTM zone, centred on the 10m Sentinel-2 grid.
+    Returns (bounds, epsg, wgs84 geometry).
+    """
+    epsg = 32600 + int((lon + 180) / 6) + 1
+    bounds, wgs_geom = _aoi(lat, lon, radius_km, epsg, snap)
+    return bounds, epsg, wgs_geom
+
+
+def web_mercator_params(lat: float, lon: float, radius_km: float, snap: float = 10):
+    """Square AOI in EPSG:3857 snapped to `snap` metres. Returns (bounds, wgs84 geometry)."""
+    return _aoi(lat, lon, radius_km, 3857, snap)
+
+
+# ==========================================
+# MASKING STRATEGIES
+# ==========================================
+# A masking strategy takes the raw stack (time, band, y, x) and returns a
+# boolean (time, y, x) array that is True where a pixel must be dropped.
+# Strategies that read the SCL band list it in `assets`.
+
+def scl_mask(classes=DEFAULT_SCL_MASKED):
+    """Drops pixels whose scene classification is in `classes`."""
+    def strategy(stack):
+        return stack.sel(band="SCL").isin(classes)
+    strategy.assets = ["SCL"]
+    return strategy
+
+
+def dilated_scl_mask(classes=DEFAULT_SCL_MASKED, iterations: int = 4):
+    """SCL mask grown by `iterations` pixels to also catch cloud edges and haze."""
+    def strategy(stack):
+        scl = stack.sel(band="SCL").compute()
+        mask = np.isin(scl, classes)
+        for t in range(mask.shape[0]):
+            mask[t] = binary_dilation(mask[t], iterations=iterations)
+        return xr.DataArray(mask, coords=scl.coords, dims=scl.dims)
+    strategy.assets = ["SCL"]
+    return strategy
+
+
+# ==========================================
+# COMPOSITING STRATEGIES
+# ==========================================
+# A compositing strategy reduces the masked (time, band, y, x) reflectance
+# cube over time.
+
+def median_composite(cube):
+    return cube.median(dim="time", skipna=True)
+
+
+# ==========================================
+# ENGINE
+# ==========================================
+
+def processing_baseline(item) -> float:
+    """Item's s2:processing_baseline as a number (0 when missing or malformed)."""
+    try:
+        return float(str(item.properties.get("s2:processing_baseline", "0")))
+    except ValueError:
+        return 0.0
+
+
+def baseline_offsets(items, stack):
+    """
+    Per-scene DN offset along the stack's time axis (float32). stackstac
+    sorts scenes by date, so offsets are matched through the stack's `id`
+    coordinate rather than the order of `items`.
+    """
+    baselines = {item.id: processing_baseline(item) for item in items}
+    offsets = np.array(
+        [BASELINE_OFFSET if baselines[item_id] >= 4.0 else 0.0 for item_id in stack["id"].values],
+        dtype=np.float32,
+    )
+    return xr.DataArray(offsets, coords={"time": stack.time}, dims=["time"])
+
+
+def stack_items(items, assets, bounds, epsg, resolution=10):
+    """Lazy float32 stack of the raw DNs, NaN where a scene has no data."""
+    return stackstac.stack(
+        items,
+        assets=assets,
+        bounds=bounds,
+        epsg=epsg,
+        resolution=resolution,
+        dtype="float32",
+        fill_value=np.float32(np.nan),
+        rescale=False,
+        chunksize=CHUNKSIZE,
+    )
+
+
+def composite(items, bands, bounds, epsg, resolution=10,
+              masking=scl_mask(), compositing=median_composite):
+    """
+    Cloud-free surface reflectance composite of `items` over `bounds`.
+
+    Every scene is stacked as float32 DNs, masked with the `masking`
+    strategy (None disables masking), corrected for the processing
+    baseline offset, scaled to reflectance in [0, 1] and reduced over
+    time with the `compositing` strategy.
+
+    Returns:
+        computed (band, y, x) float32 DataArray
+    """
+    assets = list(bands) + (getattr(masking, "assets", []) if masking else [])
+    stack = stack_items(items, assets, bounds, epsg, resolution)
+
+    cube = stack.sel(band=list(bands))
+    if masking is not None:
+        cube = cube.where(~masking(stack))
+
+    cube = ((cube - baseline_offsets(items, stack)) / REFLECTANCE_SCALE).clip(0, 1)
+
+    with ProgressBar():
+        result = compositing(cube).compute()
+    return result.astype(np.float32, copy=False)
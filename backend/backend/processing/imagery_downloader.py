@@ -1,12 +1,6 @@
-import pystac_client
-import planetary_computer
-import stackstac
-import pyproj
 import numpy as np
 import xarray as xr
-from shapely.geometry import box, mapping
-from shapely.ops import transform
-from dask.diagnostics import ProgressBar
+from shapely.geometry import shape
 import rioxarray
 import os
 from scipy.ndimage import median_filter
@@ -15,6 +9,10 @@ from typing import Tuple, List
 import time
 from pathlib import Path
 
+from processing.stac_search import search_items, filter_items
+from processing.compositing import composite, scl_mask, median_composite, utm_params
+from processing.reflectance import write_composite
+
 
 
 OUTPUT_BASE = Path("./data")
@@ -28,17 +26,7 @@ OUTPUT_AFTER.mkdir(parents=True, exist_ok=True)
 # ==========================================
 def get_utm_params(lat: float, lon: float, radius_km: float):
     """Aligns target coordinates with the 10m Sentinel-2 pixel grid."""
-    utm_zone = int((lon + 180) / 6) + 1
-    epsg = 32600 + utm_zone
-    wgs84, utm = pyproj.CRS("EPSG:4326"), pyproj.CRS.from_epsg(epsg)
-    to_utm = pyproj.Transformer.from_crs(wgs84, utm, always_xy=True).transform
-    to_wgs = pyproj.Transformer.from_crs(utm, wgs84, always_xy=True).transform
-    x_c, y_c = to_utm(lon, lat)
-    x_c, y_c = round(x_c / 10) * 10, round(y_c / 10) * 10
-    r_m = radius_km * 1000
-    utm_bounds = (x_c - r_m, y_c - r_m, x_c + r_m, y_c + r_m)
-    wgs_geom = mapping(transform(to_wgs, box(*utm_bounds)))
-    return utm_bounds, epsg, wgs_geom
+    return utm_params(lat, lon, radius_km)
 
 # ==========================================
 # 2. SPATIAL HEALING & FILTERING
@@ -69,8 +57,6 @@ def download_perfect_imagery(lat: float, lon: float, radius_km: float, target_ye
     
 
     utm_bounds, epsg, wgs_geom = get_utm_params(lat, lon, radius_km)
-    catalog = pystac_client.Client.open("https://planetarycomputer.microsoft.com/api/stac/v1", 
-                                        modifier=planetary_computer.sign_inplace)
 
     # Recursive fallback strategy for cloudy regions like Brazil
     items = []
@@ -85,55 +71,31 @@ def download_perfect_imagery(lat: float, lon: float, radius_km: float, target_ye
         if lat >= 0: dr = f"{search_year}-05-01/{search_year}-10-31"
         else: dr = f"{search_year}-11-01/{search_year + 1}-01-31"
 
-        search = catalog.search(collections=[coll], intersects=wgs_geom, datetime=dr,
-                                query={"eo:cloud_cover": {"lt": cloud_limit}},
-                                sortby=[{"field": "properties.eo:cloud_cover", "direction": "asc"}])
-        items = list(search.items())
+        items = filter_items(search_items(coll, shape(wgs_geom).bounds, datetime=dr, cloud_lt=cloud_limit), wgs_geom)
+        items = sorted(items, key=lambda item: item.properties.get("eo:cloud_cover", 100))
         if len(items) >= 10: break
 
     if not items: return print(f"❌ No data found for {label} in {target_year}.")
 
     n_stack = min(20, len(items))
     print(f"   [LOG] Mosaicking top {n_stack} scenes for ultimate clarity...")
-    
-    processed_slices = []
+
     reflectance_bands = ["B02", "B03", "B04", "B08", "B11", "B12"]
 
-    for i, item in enumerate(items[:n_stack]):
-        slice_cube = stackstac.stack(item, assets=reflectance_bands + ["SCL"],
-                                    bounds=utm_bounds, epsg=epsg, resolution=10,
-                                    dtype="float64", rescale=True, fill_value=np.nan).squeeze()
-        
-        # Radiometric Harmonization: Forces color consistency
-        pb = item.properties.get("s2:processing_baseline", "02.00")
-        if (float(pb) >= 4.0 if pb.replace('.','',1).isdigit() else pb >= "04.00"):
-            slice_cube.loc[dict(band=reflectance_bands)] -= 0.1
-
-        # Cloud & Artifact Masking
-        if "SCL" in slice_cube.band.values:
-            mask = slice_cube.sel(band="SCL").isin([0, 1, 3, 8, 9, 10])
-            slice_cube = slice_cube.sel(band=reflectance_bands).where(~mask)
-        
-        processed_slices.append(slice_cube.sel(band=reflectance_bands))
-
-    # FIXED CONCATENATION: Added coords='minimal' to solve the coordinate conflict
-    cube = xr.concat(processed_slices, dim="time", 
-                     coords='minimal', 
-                     compat='override', 
-                     combine_attrs='override', 
-                     join='override')
+    # L1C has no scene classification, so only L2A scenes are cloud-masked
+    masking = scl_mask([0, 1, 3, 8, 9, 10]) if coll.endswith("l2a") else None
 
     print("   [LOG] Computing Median Composite (Streaming Data)...")
-    with ProgressBar():
-        data = cube.median(dim="time", skipna=True).compute().astype("float32")
-    
-    data = data.where(data >= 0, 0).rio.write_nodata(np.nan).rio.write_crs(f"EPSG:{epsg}")
+    data = composite(items[:n_stack], reflectance_bands, utm_bounds, epsg,
+                     masking=masking, compositing=median_composite)
+
+    data = data.rio.write_nodata(np.nan).rio.write_crs(f"EPSG:{epsg}")
     data = heal_missing_pixels(data)
     for b in range(data.shape[0]):
         data[b].values = median_filter(data[b].values, size=3)
 
     filename = os.path.join(output_dir)
-    data.rio.to_raster(filename, compress="LZW", tiled=True, nodata=np.nan)
+    write_composite(data, filename, compress="LZW", tiled=True)
     print(f"✅ SUCCESS: {filename} ({time.time() - start_time:.1f}s)\n")
 
 # ==========================================
@@ -2,6 +2,12 @@ from pathlib import Path
 import torch
 import numpy as np
 import rasterio
+from decouple import config
+
+from processing.tiling import iter_blocks, halo_window
+from processing import model_registry
+from processing.reflectance import read_reflectance
+from processing.cog import partial_path, to_cog
 
 DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
 
@@ -10,24 +16,28 @@ MODEL_PT_PATH =  BASE_DIR / "amazon_deforestation_v1.pt"
 
 OUTPUT_BASE = Path("./data")
 OUTPUT_MASK = OUTPUT_BASE / "Amazon_Mask"
+OUTPUT_MASK.mkdir(parents=True, exist_ok=True)
 
 MODEL_PATH = MODEL_PT_PATH
 THRESHOLD = 0.4
 TILE_SIZE = 512
 TARGET_CHANNELS = 9
+OVERLAP = 0.5
+
+# Windows per forward pass and streaming block edge, set per worker
+BATCH_SIZE = config("DEFORESTATION_BATCH_SIZE", default=4, cast=int)
+STREAM_BLOCK_SIZE = config("DEFORESTATION_STREAM_BLOCK_SIZE", default=1536, cast=int)
 
 
 # -------------------------------------------------
 # Load model ONCE (important for Celery workers)
 # -------------------------------------------------
-_model = None
+model_registry.register(
+    "deforestation", MODEL_PATH, DEVICE, (BATCH_SIZE, 2 * TARGET_CHANNELS, TILE_SIZE, TILE_SIZE)
+)
 
 def load_model():
-    global _model
-    if _model is None:
-        _model = torch.jit.load(MODEL_PATH, map_location=DEVICE)
-        _model.eval()
-    return _model
+    return model_registry.get_model("deforestation")
 
 
 # -------------------------------------------------
@@ -41,71 +51,132 @@ def pad_channels(img, target=9):
     return img[:target]
 
 
-def preprocess(path):
-    with rasterio.open(path) as src:
-        img = src.read()[:, :TILE_SIZE, :TILE_SIZE]
-        meta = src.meta.copy()
+def input_scale(src):
+    """
+    Divisor that brings a raster to 0-1 reflectance. Decided once per raster
+    (from a decimated read) so every window is scaled the same way.
+    """
+    factor = max(1, max(src.height, src.width) // 1024)
+    sample = read_reflectance(src, out_shape=(src.count, max(1, src.height // factor), max(1, src.width // factor)))
+    return 3000.0 if np.nanmax(sample) > 2.0 else 1.0
+
 
+def preprocess(img, scale=1.0):
     img = pad_channels(img, TARGET_CHANNELS).astype(np.float32)
 
-    if img.max() > 2.0:
-        img /= 3000.0
+    if scale != 1.0:
+        img /= scale
 
     img = np.clip(img, 0, 1)
 
-    return img, meta
+    return img
+
+
+def _predict_change(x, model, batch_size=BATCH_SIZE):
+    """
+    Overlapping sliding-window prediction over an (18, H, W) before/after
+    stack. Windows are batched into one forward pass and their sigmoid
+    probabilities averaged where they overlap.
+    """
+    C, H, W = x.shape
+    batch_size = max(1, int(batch_size))
+
+    pad_h = (TILE_SIZE - H % TILE_SIZE) % TILE_SIZE
+    pad_w = (TILE_SIZE - W % TILE_SIZE) % TILE_SIZE
+    padded = np.pad(x, ((0, 0), (0, pad_h), (0, pad_w)), mode="reflect")
+    H_pad, W_pad = padded.shape[1:]
+    stride = int(TILE_SIZE * (1 - OVERLAP))
+
+    probs = np.zeros((H_pad, W_pad), dtype=np.float32)
+    counts = np.zeros((H_pad, W_pad), dtype=np.float32)
+
+    origins = [
+        (y, x0)
+        for y in range(0, H_pad - TILE_SIZE + 1, stride)
+        for x0 in range(0, W_pad - TILE_SIZE + 1, stride)
+    ]
+    batch = np.empty((min(batch_size, len(origins)), C, TILE_SIZE, TILE_SIZE), dtype=np.float32)
+
+    with torch.no_grad():
+        for start in range(0, len(origins), batch_size):
+            chunk = origins[start:start + batch_size]
+            for k, (y, x0) in enumerate(chunk):
+                batch[k] = padded[:, y:y+TILE_SIZE, x0:x0+TILE_SIZE]
+
+            inputs = torch.from_numpy(batch[:len(chunk)]).to(DEVICE)
+            logits = model(inputs.contiguous(memory_format=torch.channels_last))
+            scores = torch.sigmoid(logits).cpu().numpy()[:, 0]
+
+            for k, (y, x0) in enumerate(chunk):
+                probs[y:y+TILE_SIZE, x0:x0+TILE_SIZE] += scores[k]
+                counts[y:y+TILE_SIZE, x0:x0+TILE_SIZE] += 1
+
+    probs /= np.maximum(counts, 1e-6)
+    return probs[:H, :W]
 
 
 # -------------------------------------------------
 # MAIN FUNCTION YOU WANT
 # -------------------------------------------------
-def generate_deforestation_mask(before_path, after_path, location_id):
+def generate_deforestation_mask(before_path, after_path, location_id, model=None, output_path=None):
     """
     before_path  -> Sentinel before image (.tif)
     after_path   -> Sentinel after image (.tif)
     location_id -> used to generate Path to save mask file (.tif)
+    model       -> optional model overriding the registry's "deforestation" model
+    output_path -> optional mask path overriding the default naming
+
+    Both rasters are read window by window (with a halo for the overlapping
+    tiles), so any AOI size is analysed at a per-block memory cost.
 
     returns: output_path
     """
     print("Starting Mask Generation")
 
     mask_name = f"{location_id}_MASK.tif"
-    mask_path = OUTPUT_MASK / mask_name
+    mask_path = Path(output_path) if output_path else OUTPUT_MASK / mask_name
 
-    model = load_model()
+    model = load_model() if model is None else model
     print("Model Loaded")
 
-    imgA, meta = preprocess(before_path)
-    imgB, _ = preprocess(after_path)
-    print("Image Preprocessing Complete")
-
-    x = np.concatenate([imgA, imgB], axis=0)   # 18 channels
-    print("Image NP Concatenated")
-    x = torch.from_numpy(x).unsqueeze(0).to(DEVICE)
-    print("Tensor Loaded, Running Model:")
-    with torch.no_grad():
-        logits = model(x)
-        probs = torch.sigmoid(logits)
-        mask = (probs > THRESHOLD).float().cpu().numpy()[0, 0]
-
-    print("Model Work Complete, Saving image as GeoTIFF:")
-
-    # Save mask as GeoTIFF
-    out_meta = {
-        "driver": "GTiff",
-        "height": meta["height"],
-        "width": meta["width"],
-        "count": 1,
-        "dtype": "uint8",
-        "crs": meta["crs"],
-        "transform": meta["transform"],
-        "nodata": 0,          # <-- FIX (must be integer)
-        "compress": "lzw"
-    }
-
-    print("Saving GEOTIFF to Parh:")
-    with rasterio.open(mask_path, "w", **meta) as dst:
-        dst.write((mask * 255).astype(np.uint8), 1)
-
+    stride = int(TILE_SIZE * (1 - OVERLAP))
+    halo = TILE_SIZE - stride
+    block_size = max(stride, STREAM_BLOCK_SIZE // stride * stride)
+
+    with rasterio.open(before_path) as src_a, rasterio.open(after_path) as src_b:
+        H = min(src_a.height, src_b.height)
+        W = min(src_a.width, src_b.width)
+        scale_a, scale_b = input_scale(src_a), input_scale(src_b)
+
+        # Save mask as GeoTIFF
+        out_meta = {
+            "driver": "GTiff",
+            "height": H,
+            "width": W,
+            "count": 1,
+            "dtype": "uint8",
+            "crs": src_a.crs,
+            "transform": src_a.transform,
+            "compress": "lzw",
+            "tiled": True,
+            "blockxsize": 256,
+            "blockysize": 256,
+        }
+
+        print(f"Running tiled change detection on {W}x{H} px")
+        tmp_path = partial_path(mask_path)
+        with rasterio.open(tmp_path, "w", **out_meta) as dst:
+            for core in iter_blocks(H, W, block_size):
+                read_window, (r0, c0) = halo_window(core, halo, H, W)
+                imgA = preprocess(read_reflectance(src_a, window=read_window), scale_a)
+                imgB = preprocess(read_reflectance(src_b, window=read_window), scale_b)
+
+                x = np.concatenate([imgA, imgB], axis=0)   # 18 channels
+                probs = _predict_change(x, model)
+
+                core_probs = probs[r0:r0 + core.height, c0:c0 + core.width]
+                dst.write((core_probs > THRESHOLD).astype(np.uint8) * 255, 1, window=core)
+
+    to_cog(tmp_path, mask_path, categorical=True)
     print("If successful, Image saved to", mask_path)
     return str(mask_path)
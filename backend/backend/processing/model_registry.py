@@ -0,0 +1,142 @@
+# backend/processing/model_registry.py
+
+import threading
+import time
+import torch
+from decouple import config
+
+# Forward passes run on dummy input after optimisation so TorchScript's
+# profiling executor has specialised the graph before the first request.
+WARMUP_PASSES = config("MODEL_WARMUP_PASSES", default=3, cast=int)
+
+# Opt-in reduced precision. "bf16" casts the weights to bfloat16 before
+# freezing, which roughly halves CPU inference time on CPUs with native
+# bf16 support (AVX512-BF16 / AMX); check the mask agreement with the
+# compare_precision command before enabling it on a worker.
+PRECISIONS = {"fp32": torch.float32, "bf16": torch.bfloat16}
+DEFAULT_PRECISION = config("INFERENCE_PRECISION", default="fp32")
+
+_SPECS = {}     # name -> {"path", "device", "input_shape", "precision"}
+_MODELS = {}    # name -> loaded, optimised module
+_TIMINGS = {}   # name -> {"load_s", "optimize_s", "warmup_s"}
+_lock = threading.Lock()
+
+
+# ==========================================
+# REGISTRATION
+# ==========================================
+
+def register(name: str, path, device, input_shape, precision: str | None = None):
+    """
+    Declares a TorchScript model. Nothing is loaded until get_model() or
+    load_all() (called from the Celery worker_process_init hook).
+
+    input_shape is the (N, C, H, W) batch used for warmup; use the batch
+    size the worker will actually run so the warmed-up graph matches.
+    precision defaults to INFERENCE_PRECISION.
+    """
+    precision = precision or DEFAULT_PRECISION
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown inference precision '{precision}', expected one of {list(PRECISIONS)}")
+
+    _SPECS[name] = {
+        "path": path,
+        "device": torch.device(device),
+        "input_shape": tuple(input_shape),
+        "precision": precision,
+    }
+
+
+def variant(name: str, precision: str) -> str:
+    """Registers `name` at another precision (e.g. for comparisons) and returns its registry name."""
+    key = f"{name}@{precision}"
+    if key not in _SPECS:
+        spec = _SPECS[name]
+        register(key, spec["path"], spec["device"], spec["input_shape"], precision)
+    return key
+
+
+class _CastModel:
+    """Feeds a reduced-precision model and hands float32 outputs back to the caller."""
+
+    def __init__(self, model, dtype):
+        self.model = model
+        self.dtype = dtype
+
+    def __call__(self, x):
+        return self.model(x.to(self.dtype)).float()
+
+
+# ==========================================
+# LOADING
+# ==========================================
+
+def _optimize(model, device, dtype):
+    """Freezes and optimises a scripted model; falls back to the plain module."""
+    model = model.to(dtype=dtype, memory_format=torch.channels_last)
+    try:
+        frozen = torch.jit.freeze(model)
+        return torch.jit.optimize_for_inference(frozen)
+    except Exception as e:
+        print(f"⚠️ TorchScript freeze/optimize failed, using unoptimised model: {e}")
+        return model
+
+
+def _warmup(model, device, input_shape):
+    dummy = torch.zeros(input_shape, device=device).contiguous(memory_format=torch.channels_last)
+    with torch.no_grad():
+        for _ in range(WARMUP_PASSES):
+            model(dummy)
+    if device.type == "cuda":
+        torch.cuda.synchronize()
+
+
+def _load(name):
+    spec = _SPECS[name]
+    device = spec["device"]
+
+    start = time.perf_counter()
+    model = torch.jit.load(spec["path"], map_location=device)
+    model.eval()
+    load_s = time.perf_counter() - start
+
+    dtype = PRECISIONS[spec["precision"]]
+    if dtype == torch.bfloat16 and device.type == "cpu" and not torch.ops.mkldnn._is_mkldnn_bf16_supported():
+        print(f"⚠️ CPU has no native bf16 support, '{name}' will likely run slower than fp32")
+
+    start = time.perf_counter()
+    model = _optimize(model, device, dtype)
+    if dtype != torch.float32:
+        model = _CastModel(model, dtype)
+    optimize_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    _warmup(model, device, spec["input_shape"])
+    warmup_s = time.perf_counter() - start
+
+    _TIMINGS[name] = {
+        "load_s": round(load_s, 3),
+        "optimize_s": round(optimize_s, 3),
+        "warmup_s": round(warmup_s, 3),
+    }
+    print(f"Model '{name}' ({spec['precision']}) ready on {device}: {_TIMINGS[name]}")
+    return model
+
+
+def get_model(name: str):
+    """Returns the optimised model, loading it on first use."""
+    with _lock:
+        if name not in _MODELS:
+            _MODELS[name] = _load(name)
+        return _MODELS[name]
+
+
+def load_all():
+    """Loads, optimises and warms up every registered model."""
+    for name in list(_SPECS):
+        get_model(name)
+
+
+def timings() -> dict:
+    """Per-model load/optimise/warmup seconds for the models loaded in this process."""
+    return {name: dict(t) for name, t in _TIMINGS.items()}
@@ -0,0 +1,201 @@
+# backend/processing/mosaic.py
+
+import numpy as np
+import rasterio
+from rasterio import windows
+from xml.sax.saxutils import escape
+from typing import List
+from pathlib import Path
+
+from processing.tiling import iter_blocks
+from processing.cog import partial_path, to_cog
+
+# Output block edge (pixels) processed per step; memory is bounded by
+# count x MOSAIC_BLOCK_SIZE^2 regardless of the number of tiles.
+MOSAIC_BLOCK_SIZE = 1024
+
+GDAL_TYPE_NAMES = {
+    "uint8": "Byte",
+    "int8": "Int8",
+    "uint16": "UInt16",
+    "int16": "Int16",
+    "uint32": "UInt32",
+    "int32": "Int32",
+    "float32": "Float32",
+    "float64": "Float64",
+}
+
+
+# ==========================================
+# GRID
+# ==========================================
+
+def _mosaic_grid(srcs):
+    """Union bounds of the sources on the first source's pixel grid (as rasterio.merge does)."""
+    left = min(s.bounds.left for s in srcs)
+    bottom = min(s.bounds.bottom for s in srcs)
+    right = max(s.bounds.right for s in srcs)
+    top = max(s.bounds.top for s in srcs)
+
+    res_x, res_y = srcs[0].res
+    width = int(round((right - left) / res_x))
+    height = int(round((top - bottom) / res_y))
+    transform = rasterio.transform.from_origin(left, top, res_x, res_y)
+    return transform, height, width
+
+
+def _placement(src, transform):
+    """Integer window that a source occupies in the mosaic grid."""
+    return windows.from_bounds(*src.bounds, transform=transform).round_offsets().round_lengths()
+
+
+# ==========================================
+# STREAMING MOSAIC
+# ==========================================
+
+def mosaic_to_file(paths: List[str], output_path, compress: str = "lzw", categorical: bool = False,
+                   stats=None) -> str:
+    """
+    Mosaics GeoTIFF tiles into one Cloud-Optimized GeoTIFF, block by block.
+
+    Unlike rasterio.merge.merge, the mosaic is never held in memory: each
+    output block is filled from the tiles that overlap it and written out.
+    Where tiles overlap the first valid pixel wins (merge's "first" method).
+    The mosaic is assembled in a temporary GeoTIFF (compressed with
+    `compress`) and then rewritten as a COG; pass categorical=True for
+    class masks. A class_stats.ClassStats passed as `stats` is fed every
+    written block (first band).
+    """
+    paths = [p for p in paths if p]
+    srcs = [rasterio.open(p) for p in paths]
+
+    try:
+        first = srcs[0]
+        transform, height, width = _mosaic_grid(srcs)
+        placements = [_placement(s, transform) for s in srcs]
+        nodata = first.nodata
+        fill = nodata if nodata is not None else 0
+
+        profile = first.profile.copy()
+        profile.update(
+            driver="GTiff",
+            height=height,
+            width=width,
+            transform=transform,
+            tiled=True,
+            blockxsize=256,
+            blockysize=256,
+            compress=compress,
+            BIGTIFF="IF_SAFER",
+        )
+
+        tmp_path = partial_path(output_path)
+        with rasterio.open(tmp_path, "w", **profile) as dst:
+            dst.descriptions = first.descriptions
+            # Integer reflectance composites decode through these
+            dst.scales = first.scales
+            dst.offsets = first.offsets
+            if first.count == 1 and first.dtypes[0] == "uint8":
+                try:
+                    dst.write_colormap(1, first.colormap(1))
+                except ValueError:
+                    pass  # source has no colour table
+
+            for block in iter_blocks(height, width, MOSAIC_BLOCK_SIZE):
+                out = np.full((first.count, block.height, block.width), fill, dtype=first.dtypes[0])
+                filled = np.zeros((block.height, block.width), dtype=bool)
+
+                for src, placed in zip(srcs, placements):
+                    if not windows.intersect(block, placed):
+                        continue
+
+                    overlap = windows.intersection(block, placed)
+                    src_window = windows.Window(
+                        overlap.col_off - placed.col_off,
+                        overlap.row_off - placed.row_off,
+                        overlap.width,
+                        overlap.height,
+                    )
+                    data = src.read(window=src_window, masked=True)
+
+                    valid = ~np.ma.getmaskarray(data).any(axis=0)
+                    if np.issubdtype(data.dtype, np.floating):
+                        valid &= ~np.isnan(data.filled(0)).any(axis=0)
+
+                    r0 = int(overlap.row_off - block.row_off)
+                    c0 = int(overlap.col_off - block.col_off)
+                    h, w = data.shape[1:]
+
+                    take = valid & ~filled[r0:r0 + h, c0:c0 + w]
+                    out[:, r0:r0 + h, c0:c0 + w][:, take] = data.data[:, take]
+                    filled[r0:r0 + h, c0:c0 + w] |= take
+
+                dst.write(out, window=block)
+                if stats is not None:
+                    stats.add(out[0], block, transform, first.crs)
+    finally:
+        for s in srcs:
+            s.close()
+
+    to_cog(tmp_path, output_path, categorical=categorical)
+    return output_path
+
+
+# ==========================================
+# VIRTUAL MOSAIC (VRT)
+# ==========================================
+
+def write_vrt(paths: List[str], output_path) -> str:
+    """
+    Writes a GDAL VRT that mosaics the tiles without copying any pixels.
+    Sources are listed last-to-first so earlier tiles win on overlap,
+    matching mosaic_to_file.
+    """
+    paths = [str(Path(p).resolve()) for p in paths if p]
+    srcs = [rasterio.open(p) for p in paths]
+
+    try:
+        first = srcs[0]
+        transform, height, width = _mosaic_grid(srcs)
+        type_name = GDAL_TYPE_NAMES[first.dtypes[0]]
+        nodata = first.nodata
+        gt = ", ".join(repr(v) for v in transform.to_gdal())
+
+        lines = [
+            f'<VRTDataset rasterXSize="{width}" rasterYSize="{height}">',
+            f"  <SRS>{escape(first.crs.to_wkt())}</SRS>",
+            f"  <GeoTransform>{gt}</GeoTransform>",
+        ]
+        for band in range(1, first.count + 1):
+            lines.append(f'  <VRTRasterBand dataType="{type_name}" band="{band}">')
+            if nodata is not None:
+                lines.append(f"    <NoDataValue>{nodata!r}</NoDataValue>")
+            description = first.descriptions[band - 1]
+            if description:
+                lines.append(f"    <Description>{escape(description)}</Description>")
+            if first.scales[band - 1] != 1.0 or first.offsets[band - 1] != 0.0:
+                lines.append(f"    <Offset>{first.offsets[band - 1]!r}</Offset>")
+                lines.append(f"    <Scale>{first.scales[band - 1]!r}</Scale>")
+
+            for path, src in reversed(list(zip(paths, srcs))):
+                placed = _placement(src, transform)
+                lines += [
+                    "    <ComplexSource>",
+                    f'      <SourceFilename relativeToVRT="0">{escape(path)}</SourceFilename>',
+                    f"      <SourceBand>{band}</SourceBand>",
+                    f'      <SrcRect xOff="0" yOff="0" xSize="{src.width}" ySize="{src.height}"/>',
+                    f'      <DstRect xOff="{int(placed.col_off)}" yOff="{int(placed.row_off)}" '
+                    f'xSize="{int(placed.width)}" ySize="{int(placed.height)}"/>',
+                ]
+                if src.nodata is not None:
+                    lines.append(f"      <NODATA>{src.nodata!r}</NODATA>")
+                lines.append("    </ComplexSource>")
+
+            lines.append("  </VRTRasterBand>")
+        lines.append("</VRTDataset>")
+    finally:
+        for s in srcs:
+            s.close()
+
+    Path(output_path).write_text("\n".join(lines) + "\n")
+    return output_path
@@ -0,0 +1,75 @@
+# backend/processing/palette.py
+
+import numpy as np
+from PIL import Image
+
+# ==========================================
+# MANZAR LULC CLASSES
+# ==========================================
+
+NUM_CLASSES = 8
+NODATA_CLASS = 255
+
+CLASS_NAMES = [
+    "Tree cover", "Shrubland", "Grassland", "Cropland",
+    "Built-up", "Bare / Sparse", "Permanent Water", "Mangroves",
+]
+
+# ESA WorldCover code -> model class index (Strategic Framework mapping)
+ESA_TO_CLASS = {
+    10: 0,  # Tree cover
+    20: 1,  # Shrubland
+    30: 2,  # Grassland
+    40: 3,  # Cropland
+    50: 4,  # Built-up
+    60: 5,  # Bare / Sparse
+    80: 6,  # Permanent Water
+    95: 7,  # Mangroves
+}
+
+# MANZAR Color Palette (Hex → RGB 0-255)
+COLORS_HEX = [
+    "#228B22", "#808000", "#CD853F", "#FFD700",
+    "#DC143C", "#C0C0C0", "#0000FF", "#008080"
+]
+COLORS_RGB = [tuple(int(h[i:i+2], 16) for i in (1, 3, 5)) for h in COLORS_HEX]
+
+
+# ==========================================
+# LOOKUP TABLES
+# ==========================================
+
+def build_lut(mapping: dict, default: int = NODATA_CLASS) -> np.ndarray:
+    """256-entry uint8 table so a remap is a single `lut[arr]` gather."""
+    lut = np.full(256, default, dtype=np.uint8)
+    for src, dst in mapping.items():
+        lut[src] = dst
+    return lut
+
+
+ESA_LUT = build_lut(ESA_TO_CLASS)
+
+# Class index -> RGB, unused entries (incl. nodata) black
+RGB_LUT = np.zeros((256, 3), dtype=np.uint8)
+RGB_LUT[:NUM_CLASSES] = COLORS_RGB
+
+
+def remap(arr: np.ndarray, lut: np.ndarray) -> np.ndarray:
+    """Applies a 256-entry LUT to an 8-bit array in one pass."""
+    return lut[arr.astype(np.uint8, copy=False)]
+
+
+def colormap() -> dict:
+    """GeoTIFF colour table ({index: (r, g, b, a)}) for single-band class masks."""
+    cmap = {i: (0, 0, 0, 255) for i in range(256)}
+    for i, (r, g, b) in enumerate(COLORS_RGB):
+        cmap[i] = (r, g, b, 255)
+    cmap[NODATA_CLASS] = (0, 0, 0, 0)
+    return cmap
+
+
+def save_paletted_png(mask: np.ndarray, png_path) -> None:
+    """Writes class indices as a 1-byte paletted PNG instead of expanding to RGB."""
+    img = Image.fromarray(mask.astype(np.uint8, copy=False))
+    img.putpalette(RGB_LUT.ravel().tolist())  # L -> P, pixels stay 1 byte
+    img.save(png_path, optimize=True)
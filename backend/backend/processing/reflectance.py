@@ -0,0 +1,81 @@
+# backend/processing/reflectance.py
+
+import numpy as np
+import rasterio
+import rioxarray  # noqa: F401 (registers the .rio accessor)
+import xarray as xr
+from decouple import config
+
+from processing.cog import partial_path, to_cog
+
+# On-disk layout of reflectance composites. "uint16" stores reflectance the
+# way Sentinel-2 L2A does (DN = reflectance * 10000, scale/offset in the
+# GeoTIFF metadata, 0 = nodata), half the size of "float32".
+STORAGE = config("COMPOSITE_STORAGE", default="uint16")
+
+SCALE = 1e-4
+OFFSET = 0.0
+NODATA = 0
+MAX_DN = 65535
+
+
+# ==========================================
+# WRITING
+# ==========================================
+
+def encode(da):
+    """Float reflectance DataArray -> uint16 DNs; NaN becomes NODATA and valid pixels are >= 1."""
+    with xr.set_options(keep_attrs=True):
+        dn = ((da - OFFSET) / SCALE).round().clip(1, MAX_DN)
+        dn = dn.fillna(NODATA).astype(np.uint16)
+    if da.rio.crs is not None:
+        dn = dn.rio.write_crs(da.rio.crs)
+    return dn
+
+
+def write_composite(da, path, storage: str | None = None, **kwargs):
+    """
+    Writes a (band, y, x) reflectance composite as a COG in the configured
+    storage layout. Extra kwargs go to rio.to_raster for the intermediate
+    GeoTIFF (compress, tiled, ...).
+    """
+    storage = storage or STORAGE
+    tmp_path = partial_path(path)
+
+    if storage == "float32":
+        da.rio.to_raster(tmp_path, dtype="float32", **kwargs)
+    elif storage == "uint16":
+        encoded = encode(da).rio.write_nodata(NODATA)
+        encoded.rio.to_raster(tmp_path, dtype="uint16", **kwargs)
+
+        with rasterio.open(tmp_path, "r+") as dst:
+            dst.scales = [SCALE] * dst.count
+            dst.offsets = [OFFSET] * dst.count
+    else:
+        raise ValueError(f"Unknown composite storage '{storage}', expected 'uint16' or 'float32'")
+
+    to_cog(tmp_path, path)
+    return path
+
+
+# ==========================================
+# READING
+# ==========================================
+
+def read_reflectance(src, window=None, out_shape=None):
+    """
+    Reads a composite as float32 reflectance whatever its storage: integer
+    rasters are decoded with their band scales/offsets and nodata becomes
+    NaN; float rasters are returned as stored.
+    """
+    img = src.read(window=window, out_shape=out_shape)
+    if np.issubdtype(img.dtype, np.floating):
+        return img.astype(np.float32, copy=False)
+
+    invalid = img == src.nodata if src.nodata is not None else None
+    out = img.astype(np.float32)
+    out *= np.asarray(src.scales, dtype=np.float32)[:, None, None]
+    out += np.asarray(src.offsets, dtype=np.float32)[:, None, None]
+    if invalid is not None:
+        out[invalid] = np.nan
+    return out
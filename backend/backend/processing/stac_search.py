@@ -0,0 +1,68 @@
+# backend/processing/stac_search.py
+
+import threading
+import pystac_client
+import planetary_computer
+from cachetools import TTLCache
+from decouple import config
+from shapely.geometry import shape
+
+STAC_URL = "https://planetarycomputer.microsoft.com/api/stac/v1"
+
+# Planetary Computer SAS tokens on signed assets expire, so cached search
+# results must not outlive them.
+SEARCH_TTL_S = config("STAC_SEARCH_TTL", default=1800, cast=int)
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+_search_cache = TTLCache(maxsize=256, ttl=SEARCH_TTL_S)
+_search_lock = threading.Lock()
+
+
+# ==========================================
+# CATALOG + CACHED SEARCH
+# ==========================================
+
+def get_catalog():
+    """Opens the STAC catalog once per process."""
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = pystac_client.Client.open(STAC_URL, modifier=planetary_computer.sign_inplace)
+    return _catalog
+
+
+def search_items(collection: str, bbox, datetime: str | None = None, cloud_lt: float | None = None):
+    """
+    Returns the items of `collection` intersecting a WGS84 bbox.
+
+    Results are cached with a TTL keyed on (collection, bbox, datetime,
+    cloud filter), so every tile of an AOI - and every task that asks for
+    the same AOI in this process - shares one catalog round-trip.
+    """
+    bbox = tuple(round(float(v), 6) for v in bbox)
+    key = (collection, bbox, datetime, cloud_lt)
+
+    with _search_lock:
+        cached = _search_cache.get(key)
+    if cached is not None:
+        return cached
+
+    params = {"collections": [collection], "bbox": list(bbox)}
+    if datetime is not None:
+        params["datetime"] = datetime
+    if cloud_lt is not None:
+        params["query"] = {"eo:cloud_cover": {"lt": cloud_lt}}
+
+    items = list(get_catalog().search(**params).items())
+
+    with _search_lock:
+        _search_cache[key] = items
+    return items
+
+
+def filter_items(items, geom):
+    """Keeps the items whose footprint intersects a GeoJSON-like geometry (WGS84)."""
+    target = shape(geom)
+    return [item for item in items if shape(item.geometry).intersects(target)]
@@ -1,15 +1,15 @@
 # stitch_masks.py
 
-import rasterio
-from rasterio.merge import merge
 from typing import List
 from pathlib import Path
 
+from processing.mosaic import mosaic_to_file, write_vrt
+
 OUTPUT_BASE = Path("./data")
 OUTPUT_MASK = OUTPUT_BASE / "LULC_Mask"
 OUTPUT_MASK.mkdir(parents=True, exist_ok=True)
 
-def stitch_masks(mask_paths: List[str], year,location_id: str) -> str:
+def stitch_masks(mask_paths: List[str], year,location_id: str, virtual: bool = False, stats=None) -> str:
     """
     Stitches multiple mask tiles into a single mask GeoTIFF.
 
@@ -18,8 +18,12 @@ def stitch_masks(mask_paths: List[str], year,location_id: str) -> str:
     mask_paths : List[str]
         List of paths to mask GeoTIFFs
 
-    output_path : str
-        Path to save the final stitched mask
+    virtual : bool
+        Write a VRT referencing the tiles instead of copying pixels
+
+    stats : ClassStats, optional
+        Accumulates class areas while the mosaic is written (not filled
+        for VRTs, which have no writing pass)
 
     Returns
     -------
@@ -27,31 +31,16 @@ def stitch_masks(mask_paths: List[str], year,location_id: str) -> str:
         Path to the final stitched mask
     """
 
-    m_name = f"LULC_{location_id}_{year}MASK.tif"
+    m_name = f"LULC_{location_id}_{year}MASK.vrt" if virtual else f"LULC_{location_id}_{year}MASK.tif"
     output_path = OUTPUT_MASK / m_name
 
-    srcs = [rasterio.open(p) for p in mask_paths]
-
-    print(f"Stitching {len(srcs)} mask tiles...")
-
-    # Merge mask tiles
-    mosaic, transform = merge(srcs)
-
-    # Copy metadata from first mask
-    meta = srcs[0].meta.copy()
-    meta.update({
-        "height": mosaic.shape[1],
-        "width": mosaic.shape[2],
-        "transform": transform
-    })
-
-    # Save final stitched mask
-    with rasterio.open(output_path, "w", **meta) as dst:
-        dst.write(mosaic)
+    print(f"Stitching {len(mask_paths)} mask tiles...")
 
-    # Close all files
-    for s in srcs:
-        s.close()
+    # Streamed block by block (or referenced via VRT), never merged in RAM
+    if virtual:
+        write_vrt(mask_paths, output_path)
+    else:
+        mosaic_to_file(mask_paths, output_path, categorical=True, stats=stats)
 
     print(f"Final stitched mask saved to: {output_path}")
     return output_path
@@ -0,0 +1,176 @@
+# backend/processing/tile_renderer.py
+
+import hashlib
+import io
+import math
+import os
+import threading
+from functools import lru_cache
+
+import numpy as np
+import rasterio
+from cachetools import LRUCache
+from decouple import config
+from PIL import Image
+from rasterio.enums import Resampling
+from rasterio.transform import from_bounds
+from rasterio.vrt import WarpedVRT
+from rasterio.warp import transform_bounds
+
+from processing.palette import NODATA_CLASS, RGB_LUT
+
+TILE_SIZE = 256
+WEB_MERCATOR_HALF = math.pi * 6378137.0   # half the EPSG:3857 world width (m)
+
+# Rendered PNG bytes kept in memory, bounded by total size
+TILE_CACHE_BYTES = config("TILE_CACHE_MB", default=64, cast=int) * 1024 ** 2
+
+# True-colour stretch: reflectance 0..RGB_MAX maps to 0..255
+RGB_MAX = 0.3
+RGB_BANDS = (3, 2, 1)   # B04, B03, B02 in every composite layout
+
+CHANGE_RGBA = (220, 20, 60, 200)
+
+STYLES = ("classes", "change", "rgb")
+
+_tile_cache = LRUCache(maxsize=TILE_CACHE_BYTES, getsizeof=len)
+_tile_lock = threading.Lock()
+
+
+# ==========================================
+# TILE GRID
+# ==========================================
+
+def tile_bounds(z: int, x: int, y: int):
+    """EPSG:3857 bounds (left, bottom, right, top) of an XYZ tile."""
+    size = 2 * WEB_MERCATOR_HALF / (2 ** z)
+    left = -WEB_MERCATOR_HALF + x * size
+    top = WEB_MERCATOR_HALF - y * size
+    return left, top - size, left + size, top
+
+
+def tile_resolution(z: int) -> float:
+    return 2 * WEB_MERCATOR_HALF / (2 ** z) / TILE_SIZE
+
+
+@lru_cache(maxsize=256)
+def _raster_info(path: str, mtime_ns: int):
+    """Mercator bounds, resolution (m) and overview factors; cached per file version."""
+    with rasterio.open(path) as src:
+        bounds = transform_bounds(src.crs, "EPSG:3857", *src.bounds, densify_pts=21)
+        res = src.res[0] * (111320.0 if src.crs.is_geographic else 1.0)
+        return bounds, res, tuple(src.overviews(1))
+
+
+def _overview_level(factors, src_res, z):
+    """Coarsest internal overview that is still at least as fine as the tile."""
+    wanted = tile_resolution(z) / src_res
+    level = None
+    for i, factor in enumerate(factors):
+        if factor <= wanted:
+            level = i
+    return level
+
+
+# ==========================================
+# RENDERING
+# ==========================================
+
+def tile_etag(path, style: str, z: int, x: int, y: int) -> str:
+    """ETag derived from the file version and tile address, known before rendering."""
+    stat = os.stat(path)
+    raw = f"{os.path.abspath(path)}:{stat.st_mtime_ns}:{stat.st_size}:{style}:{z}/{x}/{y}"
+    return '"' + hashlib.sha1(raw.encode()).hexdigest() + '"'
+
+
+def _encode_png(rgba: np.ndarray) -> bytes:
+    buf = io.BytesIO()
+    Image.fromarray(rgba, "RGBA").save(buf, format="PNG", compress_level=3)
+    return buf.getvalue()
+
+
+@lru_cache(maxsize=1)
+def empty_tile() -> bytes:
+    return _encode_png(np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8))
+
+
+def _colorize(data: np.ndarray, style: str, nodata) -> np.ndarray:
+    rgba = np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8)
+
+    if style == "classes":
+        classes = data[0]
+        rgba[..., :3] = RGB_LUT[classes]
+        rgba[..., 3] = np.where(classes == NODATA_CLASS, 0, 255)
+    elif style == "change":
+        rgba[data[0] > 0] = CHANGE_RGBA
+    else:
+        valid = np.isfinite(data).all(axis=0)
+        if nodata is not None and not np.isnan(nodata):
+            valid &= (data != nodata).any(axis=0)
+        scaled = np.clip(np.nan_to_num(data) / RGB_MAX * 255, 0, 255).astype(np.uint8)
+        rgba[..., :3] = np.moveaxis(scaled, 0, -1)
+        rgba[..., 3] = np.where(valid, 255, 0)
+    return rgba
+
+
+def _render(path: str, style: str, z: int, x: int, y: int, overview_level) -> bytes:
+    bounds = tile_bounds(z, x, y)
+    categorical = style in ("classes", "change")
+    resampling = Resampling.nearest if categorical else Resampling.bilinear
+
+    with rasterio.open(path, overview_level=overview_level) as src:
+        indexes = [1] if categorical else list(RGB_BANDS)
+        fill = NODATA_CLASS if style == "classes" else (src.nodata if src.nodata is not None else 0)
+
+        # Warp straight onto the tile grid; GDAL only reads the source
+        # blocks that fall under the tile.
+        with WarpedVRT(
+            src,
+            crs="EPSG:3857",
+            transform=from_bounds(*bounds, TILE_SIZE, TILE_SIZE),
+            width=TILE_SIZE,
+            height=TILE_SIZE,
+            resampling=resampling,
+            nodata=fill,
+        ) as vrt:
+            data = vrt.read(indexes)
+
+            if not categorical and np.issubdtype(data.dtype, np.integer):
+                invalid = data == fill
+                scales = np.asarray([src.scales[i - 1] for i in indexes], dtype=np.float32)[:, None, None]
+                offsets = np.asarray([src.offsets[i - 1] for i in indexes], dtype=np.float32)[:, None, None]
+                data = data.astype(np.float32) * scales + offsets
+                data[invalid] = np.nan
+
+    return _encode_png(_colorize(data, style, fill))
+
+
+def render_tile(path, style: str, z: int, x: int, y: int) -> bytes:
+    """
+    PNG bytes of XYZ tile z/x/y of a raster. `style` is "classes" (LULC
+    mask, palette colours), "change" (0/255 deforestation mask) or "rgb"
+    (true colour from a reflectance composite). Tiles outside the raster
+    are transparent; rendered tiles are kept in an in-memory LRU.
+    """
+    if style not in STYLES:
+        raise ValueError(f"Unknown tile style '{style}'")
+
+    path = os.path.abspath(path)
+    mtime_ns = os.stat(path).st_mtime_ns
+    key = (path, mtime_ns, style, z, x, y)
+
+    with _tile_lock:
+        cached = _tile_cache.get(key)
+    if cached is not None:
+        return cached
+
+    raster_bounds, src_res, factors = _raster_info(path, mtime_ns)
+    left, bottom, right, top = tile_bounds(z, x, y)
+    if right <= raster_bounds[0] or left >= raster_bounds[2] or top <= raster_bounds[1] or bottom >= raster_bounds[3]:
+        return empty_tile()
+
+    png = _render(path, style, z, x, y, _overview_level(factors, src_res, z))
+
+    with _tile_lock:
+        _tile_cache[key] = png
+    return png
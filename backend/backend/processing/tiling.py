@@ -0,0 +1,64 @@
+# backend/processing/tiling.py
+
+from functools import lru_cache
+
+import numpy as np
+from rasterio.windows import Window
+
+
+# ==========================================
+# BLOCK ITERATION FOR WINDOWED RASTER I/O
+# ==========================================
+
+def iter_blocks(height: int, width: int, block_size: int):
+    """
+    Yields core windows of at most block_size x block_size covering a
+    height x width raster, row-major so finished rows come out in order.
+    """
+    for row in range(0, height, block_size):
+        for col in range(0, width, block_size):
+            yield Window(
+                col,
+                row,
+                min(block_size, width - col),
+                min(block_size, height - row),
+            )
+
+
+def halo_window(core: Window, halo: int, height: int, width: int):
+    """
+    Grows a core window by `halo` pixels on every side, clipped to the raster.
+
+    Returns:
+        (read_window, (row_off, col_off)) where the offsets locate the core
+        inside the array read with read_window.
+    """
+    row0 = max(0, core.row_off - halo)
+    col0 = max(0, core.col_off - halo)
+    row1 = min(height, core.row_off + core.height + halo)
+    col1 = min(width, core.col_off + core.width + halo)
+
+    read_window = Window(col0, row0, col1 - col0, row1 - row0)
+    return read_window, (core.row_off - row0, core.col_off - col0)
+
+
+# ==========================================
+# OVERLAP BLENDING WEIGHTS
+# ==========================================
+
+@lru_cache(maxsize=8)
+def gaussian_weights(patch_size: int, sigma_scale: float = 0.25) -> np.ndarray:
+    """
+    2D Gaussian kernel (peak 1, float32) for blending overlapping windows:
+    window centres dominate and the less reliable window edges fade out.
+    Computed once per patch size; callers must not modify the array.
+    """
+    sigma = patch_size * sigma_scale
+    r = np.arange(patch_size, dtype=np.float64) - (patch_size - 1) / 2
+    g = np.exp(-(r ** 2) / (2 * sigma ** 2))
+    kernel = np.outer(g, g)
+    # Floor keeps every weight strictly positive, so pixels seen only by window
+    # edges (image borders) still get a usable score for any sigma_scale
+    kernel = np.maximum(kernel / kernel.max(), 1e-3).astype(np.float32)
+    kernel.setflags(write=False)
+    return kernel
@@ -0,0 +1,278 @@
+# backend/queries/fastpath.py
+"""
+Deterministic extractor for fully specified requests.
+
+A message such as "deforestation at 31.08, 73.97, 20 km wide, 2019 to 2023"
+(or "... in Multan ..." for a place in the geocode cache) already contains
+everything MANZAR asks for, so the PARSED reply is built locally instead
+of going through Gemini. Anything missing, conflicting or
+ambiguous returns None and the message goes to Gemini as usual.
+"""
+import json
+import math
+import re
+from datetime import date
+
+from decouple import config
+
+from . import geocode
+
+FASTPATH_ENABLED = config("CHAT_FASTPATH", default=True, cast=bool)
+
+STUDY_KEYWORDS = {
+    "deforestation": r"deforest\w*|forest (?:cover|loss)|tree (?:cover|loss)",
+    "land use land cover": r"\blulc\b|land[ -]?use|land[ -]?cover",
+    "flooding": r"\bflood\w*|inundat\w*",
+}
+
+MONTHS = {
+    name: i
+    for i, names in enumerate(
+        [("jan", "january"), ("feb", "february"), ("mar", "march"), ("apr", "april"),
+         ("may",), ("jun", "june"), ("jul", "july"), ("aug", "august"),
+         ("sep", "sept", "september"), ("oct", "october"), ("nov", "november"), ("dec", "december")],
+        start=1,
+    )
+    for name in names
+}
+
+_NUM = r"[-+]?\d{1,3}(?:\.\d+)?"
+
+# "lat 31.5 lon 74.3", "latitude=31.5, longitude=74.3"
+COORD_KEYED_RE = re.compile(
+    rf"\blat(?:itude)?\s*[:=]?\s*(?P<lat>{_NUM})\s*°?\s*,?\s*"
+    rf"(?:lng|lon|long|longitude)\s*[:=]?\s*(?P<lon>{_NUM})",
+    re.I,
+)
+# "31.5N 74.3E", "31.5° N, 74.3° E"
+COORD_HEMI_RE = re.compile(
+    r"(?P<lat>\d{1,2}(?:\.\d+)?)\s*°?\s*(?P<ns>[NS])\b\s*,?\s*"
+    r"(?P<lon>\d{1,3}(?:\.\d+)?)\s*°?\s*(?P<ew>[EW])\b",
+    re.I,
+)
+# "31.52, 74.35" (both decimals, so year ranges never match)
+COORD_PAIR_RE = re.compile(
+    r"(?<![\d.])(?P<lat>[-+]?\d{1,2}\.\d+)\s*,\s*(?P<lon>[-+]?\d{1,3}\.\d+)(?![\d.])"
+)
+
+_UNIT = r"(?P<unit>km|kms|kilomet(?:er|re)s?|m|met(?:er|re)s?)\b"
+AREA_RE = re.compile(
+    r"(?P<value>\d+(?:\.\d+)?)\s*(?:km2|km²|sq\.?\s*km|square\s+kilomet(?:er|re)s?)",
+    re.I,
+)
+SIDE_BY_SIDE_RE = re.compile(
+    rf"(?P<value>\d+(?:\.\d+)?)\s*(?:km)?\s*[x×]\s*(?P<value2>\d+(?:\.\d+)?)\s*{_UNIT}",
+    re.I,
+)
+LENGTH_RE = re.compile(rf"(?P<value>\d+(?:\.\d+)?)\s*{_UNIT}", re.I)
+HALF_SIDE_HINT_RE = re.compile(r"radius|to (?:the )?edge|from (?:the )?cent(?:er|re)|half", re.I)
+
+_DAY = r"(?P<d>\d{1,2})(?:st|nd|rd|th)?\b"
+_MON = r"(?P<mon>[a-z]{3,9})\.?"
+_YEAR = r"(?P<y>(?:19|20)\d{2})\b"
+
+# "2022-08-15", "2022/08/15"
+ISO_DATE_RE = re.compile(r"\b(?P<y>(?:19|20)\d{2})(?P<sep>[-/.])(?P<m>\d{1,2})(?P=sep)(?P<d>\d{1,2})\b")
+# "15/06/2022", "15.06.2022" (day first)
+NUMERIC_DATE_RE = re.compile(rf"\b(?P<d>\d{{1,2}})(?P<sep>[-/.])(?P<m>\d{{1,2}})(?P=sep){_YEAR}")
+# "15 June 2022", "15th of June, 2022"
+DAY_MONTH_YEAR_RE = re.compile(rf"\b{_DAY}\s+(?:of\s+)?{_MON},?\s+{_YEAR}", re.I)
+# "June 15, 2022"
+MONTH_DAY_YEAR_RE = re.compile(rf"\b{_MON}\s+{_DAY},?\s+{_YEAR}", re.I)
+MONTH_YEAR_RE = re.compile(rf"\b{_MON},?\s+{_YEAR}", re.I)
+YEAR_RE = re.compile(r"\b(?P<y>(?:19|20)\d{2})\b")
+
+DATE_PATTERNS = [ISO_DATE_RE, NUMERIC_DATE_RE, DAY_MONTH_YEAR_RE, MONTH_DAY_YEAR_RE, MONTH_YEAR_RE]
+
+# Date words left once the dates are read ("summer 2022", "June 15", "mid-2020");
+# "may" only counts capitalised, as it is also a verb
+LOOSE_DATE_RE = re.compile(
+    r"\b(?i:spring|summer|autumn|fall|winter|monsoon|rainy|seasons?|rabi|kharif|"
+    r"early|mid|late|quarter|q[1-4]|h[12]|beginning|end|"
+    + "|".join(sorted((m for m in MONTHS if m != "may"), key=len, reverse=True))
+    + r")\b|\bMay\b"
+)
+
+# Words that stand for a date nobody wrote down ("until now", "5 years later")
+IMPLICIT_DATE_RE = re.compile(
+    r"\b(?:now|present|today|current(?:ly)?|later|ago|recent(?:ly)?|"
+    r"(?:last|past|next|previous)\s+(?:\d+|few|several|one|two|three|four|five|ten)?\s*(?:years?|months?|weeks?|days?|decades?)|"
+    r"\d+\s+(?:years?|months?|weeks?|days?|decades?))\b",
+    re.I,
+)
+# Open-ended ranges, fine only when both ends are given ("since 2019 to 2023")
+OPEN_RANGE_RE = re.compile(r"\b(?:since|until|till|starting|onwards?|after|before|beyond)\b", re.I)
+
+
+# ==========================================
+# FIELD EXTRACTORS
+# ==========================================
+# Each returns (value, spans) or (None, spans); spans are blanked out of
+# the text so later extractors don't reread the same digits.
+
+def _blank(text, spans):
+    chars = list(text)
+    for start, end in spans:
+        chars[start:end] = " " * (end - start)
+    return "".join(chars)
+
+
+def _study_type(text):
+    found = [study for study, pattern in STUDY_KEYWORDS.items() if re.search(pattern, text, re.I)]
+    return found[0] if len(found) == 1 else None
+
+
+def _coordinates(text):
+    candidates = []
+    for match in COORD_KEYED_RE.finditer(text):
+        candidates.append((float(match["lat"]), float(match["lon"]), match.span()))
+    for match in COORD_HEMI_RE.finditer(text):
+        lat = float(match["lat"]) * (-1 if match["ns"].upper() == "S" else 1)
+        lon = float(match["lon"]) * (-1 if match["ew"].upper() == "W" else 1)
+        candidates.append((lat, lon, match.span()))
+    for match in COORD_PAIR_RE.finditer(text):
+        candidates.append((float(match["lat"]), float(match["lon"]), match.span()))
+
+    spans = [span for _, _, span in candidates]
+    points = {(lat, lon) for lat, lon, _ in candidates}
+    if len(points) != 1:
+        return None, spans
+
+    lat, lon = points.pop()
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None, spans
+    return (lat, lon), spans
+
+
+def _metres(value, unit):
+    return float(value) * (1000.0 if unit.lower().startswith("k") else 1.0)
+
+
+def _distance_to_edge(text):
+    """Half the side of the square AOI in metres, from an area, a side or a radius."""
+    sizes, spans = set(), []
+
+    for match in AREA_RE.finditer(text):
+        sizes.add(math.sqrt(float(match["value"])) * 1000.0 / 2)
+        spans.append(match.span())
+    text = _blank(text, spans)
+
+    for match in SIDE_BY_SIDE_RE.finditer(text):
+        if match["value"] != match["value2"]:
+            return None, spans         # not a square
+        sizes.add(_metres(match["value"], match["unit"]) / 2)
+        spans.append(match.span())
+    text = _blank(text, spans)
+
+    for match in LENGTH_RE.finditer(text):
+        metres = _metres(match["value"], match["unit"])
+        context = text[max(0, match.start() - 25):match.end() + 25]
+        # "N km" is a side length ("20 km wide") unless worded as a radius
+        sizes.add(metres if HALF_SIDE_HINT_RE.search(context) else metres / 2)
+        spans.append(match.span())
+
+    if len(sizes) != 1:
+        return None, spans
+    distance = sizes.pop()
+    return (round(distance, 1) if distance > 0 else None), spans
+
+
+def _dates(text):
+    """
+    Sorted distinct dates, or None when a date is only partly readable
+    (leftover digits, month names or seasons next to a year). A bare year
+    or "Mon YYYY" resolves to its earliest day.
+    """
+    found, spans = set(), []
+    try:
+        for pattern in DATE_PATTERNS:
+            for match in pattern.finditer(text):
+                fields = match.groupdict()
+                if "mon" in fields:
+                    month = MONTHS.get(fields["mon"].lower())
+                    if month is None:
+                        continue        # "in 2019", "of 2020"
+                else:
+                    month = int(fields["m"])
+                day = int(fields.get("d") or 1)
+                if pattern is NUMERIC_DATE_RE and day <= 12 and month <= 12 and day != month:
+                    return None         # 03/06/2022 reads either way
+                found.add(date(int(fields["y"]), month, day))
+                spans.append(match.span())
+            text = _blank(text, spans)
+    except ValueError:
+        return None
+
+    for match in YEAR_RE.finditer(text):
+        found.add(date(int(match["y"]), 1, 1))
+        spans.append(match.span())
+    text = _blank(text, spans)
+
+    if re.search(r"\d", text) or LOOSE_DATE_RE.search(text):
+        return None
+    return sorted(found)
+
+
+# ==========================================
+# ENTRY POINTS
+# ==========================================
+
+def parse_request(text: str):
+    """PARSED fields for a message that fully specifies a request, else None."""
+    study_type = _study_type(text)
+    if study_type is None:
+        return None
+
+    location, coord_spans = _coordinates(text)
+    if location is None and coord_spans:
+        return None         # several or invalid points
+    text = _blank(text, coord_spans)
+
+    distance, size_spans = _distance_to_edge(text)
+    if distance is None:
+        return None
+    text = _blank(text, size_spans)
+
+    dates = _dates(text)
+    if not dates or len(dates) > 2:
+        return None
+    # A relative or open-ended period needs Gemini to pin down its dates
+    if IMPLICIT_DATE_RE.search(text) or (len(dates) < 2 and OPEN_RANGE_RE.search(text)):
+        return None
+    start, end = dates[0], dates[-1]
+
+    # Place names only resolve through the geocode cache, never a live lookup
+    place = geocode.find_in_text(text)
+    if location is None:
+        if place is None:
+            return None
+        location = (place["latitude"], place["longitude"])
+
+    lat, lon = location
+    return {
+        "study_type": study_type,
+        "location_name": place["name"] if place else f"{lat:.4f}, {lon:.4f}",
+        "location": {"latitude": lat, "longitude": lon},
+        "distance_to_edge": distance,
+        "is_timeseries": start != end,
+        "time_range": start.isoformat() if start == end else f"{start.isoformat()} to {end.isoformat()}",
+        "date_range_start": start.isoformat(),
+        "date_range_end": end.isoformat(),
+    }
+
+
+def fastpath_reply(history_messages):
+    """
+    The reply Gemini would give ("PARSED\\n{json}") when the latest user
+    message is a complete request, or None to fall back to Gemini.
+    """
+    if not FASTPATH_ENABLED or not history_messages:
+        return None
+    last = history_messages[-1]
+    if last.get("role") != "user" or not isinstance(last.get("content"), str):
+        return None
+
+    parsed = parse_request(last["content"])
+    if parsed is None:
+        return None
+    return "PARSED\n" + json.dumps(parsed, indent=2)
@@ -1,12 +1,38 @@
 # backend/queries/gemini.py
+import asyncio
+import hashlib
+import json
+import threading
+import time
+
+from cachetools import TTLCache
 from decouple import config
 from google.genai import Client
-from google.genai.types import GenerateContentConfig, GoogleSearch, Tool
+from google.genai.types import CreateCachedContentConfig, GenerateContentConfig, GoogleSearch, Tool
+
+GEMINI_API_KEY = config("GEMINI_API_KEY", default="")
 
-GEMINI_API_KEY = config("GEMINI_API_KEY")
+# "genai" for the real API, "stub" for the offline client in gemini_stub.py
+GEMINI_CLIENT = config("GEMINI_CLIENT", default="genai")
 
 # Use Gemini 2.5 Flash with online/web search
 MODEL_NAME = "gemini-3-flash-preview"
+SUMMARY_MODEL = config("GEMINI_SUMMARY_MODEL", default=MODEL_NAME)
+
+# Explicit context cache for the system prompt + tools. Off by default:
+# Gemini already caches repeated prompt prefixes implicitly, and explicit
+# caches have a minimum size and bill for storage.
+CONTEXT_CACHE = config("GEMINI_CONTEXT_CACHE", default=False, cast=bool)
+CONTEXT_CACHE_TTL = config("GEMINI_CONTEXT_CACHE_TTL", default=3600, cast=int)
+# After a failed cache creation, use system_instruction for this long before retrying
+CONTEXT_CACHE_RETRY = config("GEMINI_CONTEXT_CACHE_RETRY", default=300, cast=int)
+
+# History compaction: once the history exceeds the budget, everything but
+# the most recent messages is folded into a summary. The fold point moves
+# in steps so the summary (and the cached prefix) changes only every few turns.
+HISTORY_TOKEN_BUDGET = config("GEMINI_HISTORY_TOKEN_BUDGET", default=4000, cast=int)
+KEEP_RECENT_MESSAGES = config("GEMINI_KEEP_RECENT_MESSAGES", default=6, cast=int)
+SUMMARY_STEP = config("GEMINI_SUMMARY_STEP", default=4, cast=int)
 
 SYSTEM_PROMPT = """
 You are MANZAR, an intelligent geospatial analysis assistant. Your job is to help users — who may have no technical background — describe what they want to study, and then build a structured analysis request from that conversation.
@@ -76,8 +102,202 @@ Required JSON fields:
 PARSED must be the very first line of your response when outputting the result.
 """
 
-# Create the client
-client = Client(api_key=GEMINI_API_KEY)
+SUMMARY_PROMPT = """
+You compress the earlier part of a conversation between a user and MANZAR, a geospatial analysis assistant.
+Write a short factual summary that keeps everything needed to continue it:
+- what the user wants to study and where (place names, any coordinates already resolved)
+- area size, time period and timeseries choice, with exact numbers and dates
+- what the user has confirmed, corrected or rejected, and what MANZAR asked last
+Use plain bullet points. Do not add anything that was not said.
+"""
+
+TOOLS = [
+    Tool(
+        google_search=GoogleSearch()
+    )
+]
+
+# Map DRF/frontend roles to Gemini roles
+ROLE_MAP = {"user": "user", "assistant": "model", "gemini": "model"}
+
+
+# ==========================================
+# CLIENT
+# ==========================================
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Client created on first use, so importing this module needs no API key."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                if GEMINI_CLIENT == "stub":
+                    from .gemini_stub import StubClient
+                    _client = StubClient()
+                else:
+                    _client = Client(api_key=GEMINI_API_KEY)
+    return _client
+
+
+def set_client(client):
+    """Replaces the client (e.g. with a StubClient); also drops cached state tied to the old one."""
+    global _client, _context_cache, _context_cache_retry_at
+    with _client_lock:
+        _client = client
+        _context_cache = None
+        _context_cache_retry_at = 0.0
+        _summaries.clear()
+
+
+# ==========================================
+# SYSTEM PROMPT CACHE
+# ==========================================
+
+_context_cache = None            # (name, expires_at) of the explicit cache
+_context_cache_retry_at = 0.0     # no creation attempts before this time
+_context_cache_lock = threading.Lock()
+
+
+def _cached_context_name():
+    """Name of a live explicit cache holding SYSTEM_PROMPT + TOOLS, or None."""
+    global _context_cache, _context_cache_retry_at
+    if not CONTEXT_CACHE or time.time() < _context_cache_retry_at:
+        return None
+
+    with _context_cache_lock:
+        if _context_cache and _context_cache[1] > time.time():
+            return _context_cache[0]
+        try:
+            cache = get_client().caches.create(
+                model=MODEL_NAME,
+                config=CreateCachedContentConfig(
+                    system_instruction=SYSTEM_PROMPT,
+                    tools=TOOLS,
+                    ttl=f"{CONTEXT_CACHE_TTL}s",
+                ),
+            )
+        except Exception as e:
+            # e.g. prompt below the model's minimum cache size
+            print(f"⚠️ Gemini context cache unavailable, using system_instruction for {CONTEXT_CACHE_RETRY}s: {e}")
+            _context_cache_retry_at = time.time() + CONTEXT_CACHE_RETRY
+            return None
+
+        # Renew a minute early rather than race the expiry
+        _context_cache = (cache.name, time.time() + CONTEXT_CACHE_TTL - 60)
+        return cache.name
+
+
+def _generation_config():
+    cache_name = _cached_context_name()
+    if cache_name:
+        return GenerateContentConfig(cached_content=cache_name)
+    return GenerateContentConfig(system_instruction=SYSTEM_PROMPT, tools=TOOLS)
+
+
+# ==========================================
+# HISTORY COMPACTION
+# ==========================================
+
+# Summaries keyed by a hash of the messages they replace
+_summaries = TTLCache(maxsize=512, ttl=6 * 3600)
+_summaries_lock = threading.Lock()
+
+
+def estimate_tokens(history_messages) -> int:
+    """Rough token count (~4 characters per token); good enough for a budget."""
+    return sum(len(msg["content"]) for msg in history_messages) // 4
+
+
+def _history_key(history_messages) -> str:
+    raw = json.dumps([(msg["role"], msg["content"]) for msg in history_messages])
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def _summarize(history_messages) -> str:
+    """
+    Summary of history_messages, built incrementally: the summary of the
+    previous fold point (if cached) is extended with the newer messages.
+    """
+    key = _history_key(history_messages)
+    with _summaries_lock:
+        cached = _summaries.get(key)
+    if cached is not None:
+        return cached
+
+    previous, start = None, 0
+    for cut in range(len(history_messages) - SUMMARY_STEP, 0, -SUMMARY_STEP):
+        with _summaries_lock:
+            previous = _summaries.get(_history_key(history_messages[:cut]))
+        if previous is not None:
+            start = cut
+            break
+
+    transcript = "\n".join(
+        f"{'MANZAR' if ROLE_MAP.get(msg['role']) == 'model' else 'User'}: {msg['content']}"
+        for msg in history_messages[start:]
+    )
+    if previous:
+        transcript = f"Summary so far:\n{previous}\n\nLater messages:\n{transcript}"
+
+    response = get_client().models.generate_content(
+        model=SUMMARY_MODEL,
+        contents=[{"role": "user", "parts": [{"text": transcript}]}],
+        config=GenerateContentConfig(system_instruction=SUMMARY_PROMPT),
+    )
+    summary = response.candidates[0].content.parts[0].text
+
+    with _summaries_lock:
+        _summaries[key] = summary
+    return summary
+
+
+def compact_history(history_messages):
+    """
+    History to send: unchanged while within HISTORY_TOKEN_BUDGET, otherwise
+    a summary of the older messages followed by the most recent ones.
+    """
+    if estimate_tokens(history_messages) <= HISTORY_TOKEN_BUDGET:
+        return history_messages
+
+    cut = len(history_messages) - KEEP_RECENT_MESSAGES
+    cut -= cut % SUMMARY_STEP
+    if cut <= 0:
+        return history_messages
+
+    summary = _summarize(history_messages[:cut])
+    return [
+        {"role": "user", "content": f"Summary of our conversation so far:\n{summary}"},
+        {"role": "assistant", "content": "Understood, I'll continue from there."},
+    ] + list(history_messages[cut:])
+
+
+def _build_contents(history_messages):
+    return [
+        {
+            "role": ROLE_MAP.get(msg["role"], "user"),
+            "parts": [{"text": msg["content"]}]
+        }
+        for msg in history_messages
+    ]
+
+
+def _log_usage(response):
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None:
+        print(
+            f"Gemini tokens: prompt={usage.prompt_token_count} "
+            f"cached={usage.cached_content_token_count or 0} "
+            f"reply={usage.candidates_token_count}"
+        )
+
+
+# ==========================================
+# CHAT
+# ==========================================
 
 def get_gemini_reply(history_messages):
     """
@@ -87,31 +307,32 @@ def get_gemini_reply(history_messages):
         ...
     ]
     """
-    # Start with SYSTEM_PROMPT as first message
-    contents = [{
-        "role": "user",  # system role works sometimes, but user is safest
-        "parts": [{"text": SYSTEM_PROMPT}]
-    }]
-
-    # Map DRF roles to Gemini roles
-    role_map = {"user": "user", "assistant": "model"}
-    for msg in history_messages:
-        contents.append({
-            "role": role_map.get(msg["role"], "user"),
-            "parts": [{"text": msg["content"]}]
-        })
-
-    response = client.models.generate_content(
+    response = get_client().models.generate_content(
         model=MODEL_NAME,
-        contents=contents,
-        config=GenerateContentConfig(
-            tools=[
-                Tool(
-                    google_search=GoogleSearch()
-                )
-            ]
-        )
+        contents=_build_contents(compact_history(history_messages)),
+        config=_generation_config(),
     )
+    _log_usage(response)
 
     # Return the first generated text
     return response.candidates[0].content.parts[0].text
+
+
+async def stream_gemini_reply(history_messages):
+    """
+    Async generator over the reply's text chunks as Gemini produces them
+    (same history format as get_gemini_reply). Runs on the event loop, so
+    no worker thread is held while waiting for tokens.
+    """
+    # Compaction and cache setup may make blocking calls
+    history = await asyncio.to_thread(compact_history, history_messages)
+    config = await asyncio.to_thread(_generation_config)
+
+    stream = await get_client().aio.models.generate_content_stream(
+        model=MODEL_NAME,
+        contents=_build_contents(history),
+        config=config,
+    )
+    async for chunk in stream:
+        if chunk.text:
+            yield chunk.text
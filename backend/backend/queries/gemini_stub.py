@@ -0,0 +1,96 @@
+# backend/queries/gemini_stub.py
+"""
+Offline stand-in for google.genai.Client, selected with GEMINI_CLIENT=stub.
+
+Implements only what queries/gemini.py uses (models.generate_content,
+aio.models.generate_content_stream, caches.create) and returns
+deterministic replies with usage metadata estimated from the request,
+so the chat flow, caching and history compaction can be exercised
+without network access or an API key. Every request is kept in `calls`.
+"""
+from types import SimpleNamespace
+
+ECHO_CHARS = 200
+
+
+def _text_of(contents) -> str:
+    return " ".join(
+        part.get("text", "")
+        for content in contents or []
+        for part in content.get("parts", [])
+    )
+
+
+def _estimate(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class _Models:
+    def __init__(self, stub):
+        self._stub = stub
+
+    def generate_content(self, model, contents, config=None):
+        return self._stub._respond(model, contents, config)
+
+
+class _AsyncModels:
+    def __init__(self, stub):
+        self._stub = stub
+
+    async def generate_content_stream(self, model, contents, config=None):
+        response = self._stub._respond(model, contents, config)
+        words = response.text.split(" ")
+
+        async def chunks():
+            for i, word in enumerate(words):
+                yield SimpleNamespace(text=word if i == 0 else " " + word)
+
+        return chunks()
+
+
+class _Caches:
+    def __init__(self, stub):
+        self._stub = stub
+
+    def create(self, model, config=None):
+        name = f"cachedContents/stub-{len(self._stub.cached_contents) + 1}"
+        self._stub.cached_contents[name] = config
+        return SimpleNamespace(name=name, model=model)
+
+
+class StubClient:
+    def __init__(self, reply=None):
+        # reply(model, contents, config) -> str; defaults to echoing the last message
+        self.reply = reply or self._echo
+        self.calls = []
+        self.cached_contents = {}
+        self.models = _Models(self)
+        self.aio = SimpleNamespace(models=_AsyncModels(self))
+        self.caches = _Caches(self)
+
+    @staticmethod
+    def _echo(model, contents, config):
+        last = contents[-1]["parts"][0]["text"] if contents else ""
+        return f"[stub:{model}] {last[:ECHO_CHARS]}"
+
+    def _respond(self, model, contents, config):
+        self.calls.append(SimpleNamespace(model=model, contents=contents, config=config))
+        text = self.reply(model, contents, config)
+
+        system = getattr(config, "system_instruction", None) or ""
+        cached_name = getattr(config, "cached_content", None)
+        cached = self.cached_contents.get(cached_name) if cached_name else None
+        cached_tokens = _estimate(cached.system_instruction) if cached else 0
+
+        usage = SimpleNamespace(
+            prompt_token_count=_estimate(_text_of(contents) + system) + cached_tokens,
+            cached_content_token_count=cached_tokens,
+            candidates_token_count=_estimate(text),
+        )
+        part = SimpleNamespace(text=text)
+        return SimpleNamespace(
+            text=text,
+            candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))],
+            usage_metadata=usage,
+        )
+
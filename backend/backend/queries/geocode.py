@@ -0,0 +1,247 @@
+# backend/queries/geocode.py
+"""
+Place name -> coordinates cache shared by the chat and the map search.
+
+Lookups go memory (TTL cache) -> GeocodeEntry table -> bundled gazetteer
+(data/gazetteer.json, copied into the table on first use). Names resolved
+elsewhere (Gemini's PARSED replies, Places results picked on the map) are
+stored with remember(). Hit counts are buffered in memory and written in
+batches so a cached lookup never touches the database.
+"""
+import json
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter
+from datetime import timedelta
+from functools import lru_cache
+from pathlib import Path
+
+from cachetools import TTLCache
+from decouple import config
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import GeocodeEntry
+
+GAZETTEER_PATH = Path(__file__).resolve().parent / "data" / "gazetteer.json"
+
+GEOCODE_TTL_DAYS = config("GEOCODE_TTL_DAYS", default=90, cast=int)
+MEMORY_TTL_SECONDS = config("GEOCODE_MEMORY_TTL", default=3600, cast=int)
+HIT_FLUSH_SECONDS = 30
+
+# Longest place name (in words) searched for inside free text
+MAX_NAME_WORDS = 4
+
+_memory = TTLCache(maxsize=4096, ttl=MEMORY_TTL_SECONDS)
+_pending_hits = Counter()
+_last_flush = time.monotonic()
+_lock = threading.Lock()
+
+
+# ==========================================
+# NAMES
+# ==========================================
+
+def normalize_name(name: str) -> str:
+    """'Dera Ghazi Khan, Pakistan ' -> 'dera ghazi khan pakistan' (accents, case and punctuation dropped)."""
+    name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode()
+    name = re.sub(r"[^a-z0-9]+", " ", name.lower())
+    return name.strip()
+
+
+def _candidates(name: str):
+    """The full name, then with trailing comma parts dropped ('Multan, Punjab, Pakistan' -> ..., 'multan')."""
+    parts = [p for p in name.split(",") if p.strip()]
+    keys = []
+    for end in range(len(parts), 0, -1):
+        key = normalize_name(",".join(parts[:end]))
+        if key and key not in keys:
+            keys.append(key)
+    return keys
+
+
+@lru_cache(maxsize=1)
+def _gazetteer() -> dict:
+    with open(GAZETTEER_PATH, encoding="utf-8") as f:
+        places = json.load(f)
+
+    index = {}
+    for place in places:
+        for alias in [place["name"], *place.get("aliases", [])]:
+            index.setdefault(normalize_name(alias), place)
+    return index
+
+
+# ==========================================
+# CACHE
+# ==========================================
+
+def _as_dict(entry: GeocodeEntry) -> dict:
+    bbox = [entry.bbox_west, entry.bbox_south, entry.bbox_east, entry.bbox_north]
+    return {
+        "name": entry.display_name,
+        "latitude": entry.latitude,
+        "longitude": entry.longitude,
+        "bbox": bbox if None not in bbox else None,
+        "source": entry.source,
+    }
+
+
+def _live(queryset):
+    return queryset.filter(Q(expires_at__isnull=True) | Q(expires_at__gt=timezone.now()))
+
+
+def _from_gazetteer(key: str):
+    place = _gazetteer().get(key)
+    if place is None:
+        return None
+    west, south, east, north = place.get("bbox") or (None,) * 4
+    entry, _ = GeocodeEntry.objects.update_or_create(
+        normalized_name=key,
+        defaults={
+            "display_name": place["name"],
+            "latitude": place["latitude"],
+            "longitude": place["longitude"],
+            "bbox_west": west,
+            "bbox_south": south,
+            "bbox_east": east,
+            "bbox_north": north,
+            "source": "gazetteer",
+            "expires_at": None,
+        },
+    )
+    return entry
+
+
+def _count_hit(key: str):
+    with _lock:
+        _pending_hits[key] += 1
+        due = time.monotonic() - _last_flush >= HIT_FLUSH_SECONDS
+    if due:
+        flush_hits()
+
+
+def flush_hits():
+    """Writes buffered hit counts to the table."""
+    global _pending_hits, _last_flush
+    with _lock:
+        pending, _pending_hits = _pending_hits, Counter()
+        _last_flush = time.monotonic()
+
+    now = timezone.now()
+    for key, hits in pending.items():
+        GeocodeEntry.objects.filter(normalized_name=key).update(
+            hit_count=F("hit_count") + hits, last_hit_at=now
+        )
+
+
+def lookup(name: str):
+    """Cached location for a place name ({name, latitude, longitude, bbox, source}) or None."""
+    keys = _candidates(name)
+
+    for key in keys:
+        with _lock:
+            cached = _memory.get(key)
+        if cached is not None:
+            _count_hit(key)
+            return cached
+
+    for key in keys:
+        entry = _live(GeocodeEntry.objects.filter(normalized_name=key)).first() or _from_gazetteer(key)
+        if entry is not None:
+            result = _as_dict(entry)
+            with _lock:
+                _memory[key] = result
+            _count_hit(key)
+            return result
+
+    return None
+
+
+def remember(name: str, latitude: float, longitude: float, bbox=None, source: str = "chat"):
+    """
+    Stores a resolved place name. Gazetteer entries are kept as they are,
+    so a chat answer can't move a seeded region.
+    """
+    key = normalize_name(name)
+    if not re.search(r"[a-z]", key):
+        return None         # empty, or just coordinates
+
+    entry = GeocodeEntry.objects.filter(normalized_name=key).first()
+    if entry is not None and entry.source == "gazetteer":
+        return _as_dict(entry)
+    if key in _gazetteer():
+        return _as_dict(_from_gazetteer(key))
+
+    west, south, east, north = bbox or (None,) * 4
+    entry, _ = GeocodeEntry.objects.update_or_create(
+        normalized_name=key,
+        defaults={
+            "display_name": name.strip(),
+            "latitude": float(latitude),
+            "longitude": float(longitude),
+            "bbox_west": west,
+            "bbox_south": south,
+            "bbox_east": east,
+            "bbox_north": north,
+            "source": source,
+            "expires_at": timezone.now() + timedelta(days=GEOCODE_TTL_DAYS),
+        },
+    )
+    result = _as_dict(entry)
+    with _lock:
+        _memory[key] = result
+    return result
+
+
+def find_in_text(text: str):
+    """
+    The single known place named in free text, or None when there is
+    none or several. Longer names win over names contained in them.
+    """
+    words = normalize_name(text).split()
+    grams = {
+        " ".join(words[i:i + n])
+        for n in range(1, MAX_NAME_WORDS + 1)
+        for i in range(len(words) - n + 1)
+    }
+    if not grams:
+        return None
+
+    with _lock:
+        known = {g for g in grams if g in _memory}
+    known |= {g for g in grams if g in _gazetteer()}
+    known |= set(_live(GeocodeEntry.objects.filter(normalized_name__in=grams)).values_list("normalized_name", flat=True))
+
+    names = [g for g in known if not any(g != other and f" {g} " in f" {other} " for other in known)]
+    places = list({(p["latitude"], p["longitude"]): p for p in filter(None, map(lookup, names))}.values())
+
+    # "Lahore, Punjab": drop regions that contain another named place
+    places = [
+        p for p in places
+        if not any(q is not p and _contains(p["bbox"], q) for q in places)
+    ]
+    return places[0] if len(places) == 1 else None
+
+
+def _contains(bbox, place) -> bool:
+    if bbox is None:
+        return False
+    west, south, east, north = bbox
+    return west <= place["longitude"] <= east and south <= place["latitude"] <= north
+
+
+def remember_parsed_reply(reply: str):
+    """Stores location_name -> location from a Gemini 'PARSED {json}' reply, if it is one."""
+    if not reply or not reply.strip().startswith("PARSED"):
+        return
+    body = reply.strip()[len("PARSED"):].strip()
+    body = re.sub(r"^```(?:json)?\s*|```$", "", body).strip()
+    try:
+        parsed = json.loads(body)
+        location = parsed["location"]
+        remember(parsed["location_name"], location["latitude"], location["longitude"], source="chat")
+    except (ValueError, KeyError, TypeError):
+        pass
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.26 on 2026-10-18 02:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('queries', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeocodeEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('normalized_name', models.CharField(max_length=255, unique=True)),
+                ('display_name', models.CharField(max_length=255)),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('bbox_west', models.FloatField(blank=True, null=True)),
+                ('bbox_south', models.FloatField(blank=True, null=True)),
+                ('bbox_east', models.FloatField(blank=True, null=True)),
+                ('bbox_north', models.FloatField(blank=True, null=True)),
+                ('source', models.CharField(choices=[('gazetteer', 'Gazetteer'), ('chat', 'Chat'), ('map', 'Map')], max_length=20)),
+                ('hit_count', models.PositiveIntegerField(default=0)),
+                ('last_hit_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.26 on 2026-10-18 02:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('queries', '0002_geocodeentry'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='parsedrequest',
+            index=models.Index(fields=['user', 'submitted_at', 'request_id'], name='parsedreq_user_submitted_idx'),
+        ),
+    ]
@@ -35,5 +35,45 @@ class ParsedRequest(models.Model):
 
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="parsed_requests")
 
+    class Meta:
+        indexes = [
+            # Keyset pagination of a user's requests, newest first
+            models.Index(fields=["user", "submitted_at", "request_id"], name="parsedreq_user_submitted_idx"),
+        ]
+
     def __str__(self):
         return f"{self.region_name} ({self.request_id}) - {self.status}"
+
+
+class GeocodeEntry(models.Model):
+    """
+    Place name -> coordinates resolved during chat or on the map, so
+    popular regions aren't looked up again. Entries from the bundled
+    gazetteer never expire; others expire after GEOCODE_TTL_DAYS.
+    """
+    SOURCE_CHOICES = [
+        ('gazetteer', 'Gazetteer'),
+        ('chat', 'Chat'),
+        ('map', 'Map'),
+    ]
+
+    normalized_name = models.CharField(max_length=255, unique=True)
+    display_name = models.CharField(max_length=255)
+
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+
+    # Bounding box (WGS84), when the source provides one
+    bbox_west = models.FloatField(null=True, blank=True)
+    bbox_south = models.FloatField(null=True, blank=True)
+    bbox_east = models.FloatField(null=True, blank=True)
+    bbox_north = models.FloatField(null=True, blank=True)
+
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    hit_count = models.PositiveIntegerField(default=0)
+    last_hit_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.display_name} ({self.latitude:.4f}, {self.longitude:.4f})"
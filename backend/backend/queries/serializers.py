@@ -2,6 +2,14 @@ from rest_framework import serializers
 from .models import ParsedRequest
 
 class ParsedRequestSerializer(serializers.ModelSerializer):
+    """Pass fields=[...] to serialize only a subset (sparse fieldsets)."""
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
     class Meta:
         model = ParsedRequest
         fields = [
@@ -1,3 +1,269 @@
-from django.test import TestCase
+import base64
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import gemini
+from .fastpath import fastpath_reply, parse_request
+from .gemini_stub import StubClient
+from .models import ParsedRequest
+
+
+class FastPathAcceptTests(TestCase):
+    """Fully specified requests are parsed locally."""
+
+    def test_coordinates_side_and_year_range(self):
+        parsed = parse_request("deforestation at 31.08, 73.97, 20 km wide, 2019 to 2023")
+        self.assertEqual(parsed["study_type"], "deforestation")
+        self.assertEqual(parsed["location"], {"latitude": 31.08, "longitude": 73.97})
+        self.assertEqual(parsed["distance_to_edge"], 10000.0)
+        self.assertTrue(parsed["is_timeseries"])
+        self.assertEqual(parsed["date_range_start"], "2019-01-01")
+        self.assertEqual(parsed["date_range_end"], "2023-01-01")
+
+    def test_keyed_coordinates_area_and_single_year(self):
+        parsed = parse_request("Land cover map for lat 33.6844 lon 73.0479 covering 400 km2 in 2022")
+        self.assertEqual(parsed["study_type"], "land use land cover")
+        self.assertEqual(parsed["distance_to_edge"], 10000.0)
+        self.assertFalse(parsed["is_timeseries"])
+        self.assertEqual(parsed["date_range_start"], parsed["date_range_end"])
+
+    def test_hemisphere_coordinates_radius_and_months(self):
+        parsed = parse_request("flood extent 30.19N 71.47E radius 15km from June 2022 to September 2022")
+        self.assertEqual(parsed["study_type"], "flooding")
+        self.assertEqual(parsed["distance_to_edge"], 15000.0)
+        self.assertEqual(parsed["date_range_start"], "2022-06-01")
+        self.assertEqual(parsed["date_range_end"], "2022-09-01")
+
+    def test_iso_dates_and_square_size(self):
+        parsed = parse_request("LULC 24.86, 67.01 5 km x 5 km 2020-01-15 - 2021-03-01")
+        self.assertEqual(parsed["distance_to_edge"], 2500.0)
+        self.assertEqual(parsed["date_range_start"], "2020-01-15")
+        self.assertEqual(parsed["date_range_end"], "2021-03-01")
+
+    def test_open_range_word_with_both_ends(self):
+        parsed = parse_request("deforestation at 31.08, 73.97, 20 km, since 2019 until 2023")
+        self.assertEqual(parsed["date_range_start"], "2019-01-01")
+        self.assertEqual(parsed["date_range_end"], "2023-01-01")
+
+    def test_day_month_year_forms(self):
+        for text in [
+            "flooding at 31.08, 73.97 20 km wide, 15 June 2022",
+            "flooding at 31.08, 73.97 20 km wide, on 15/06/2022",
+            "flooding at 31.08, 73.97 20 km wide, June 15, 2022",
+            "flooding at 31.08, 73.97 20 km wide, 15th of June, 2022",
+        ]:
+            with self.subTest(text=text):
+                parsed = parse_request(text)
+                self.assertEqual(parsed["date_range_start"], "2022-06-15")
+                self.assertFalse(parsed["is_timeseries"])
+
+    def test_slashed_iso_date(self):
+        parsed = parse_request("flooding at 31.08, 73.97 20 km wide, 2022/08/15")
+        self.assertEqual(parsed["date_range_start"], "2022-08-15")
+
+    def test_gazetteer_place_name(self):
+        parsed = parse_request("land cover map of Lahore, Punjab, 20 km wide, 2022")
+        self.assertEqual(parsed["location_name"], "Lahore")
+
+    def test_reply_format(self):
+        reply = fastpath_reply([{"role": "user", "content": "deforestation at 31.08, 73.97, 20 km wide, 2019 to 2023"}])
+        self.assertTrue(reply.startswith("PARSED\n"))
+
+
+class FastPathRejectTests(TestCase):
+    """Anything incomplete, ambiguous or relative falls through to Gemini."""
+
+    REJECTED = [
+        # relative or open-ended periods
+        "deforestation at 31.08, 73.97, 20 km, since 2019",
+        "deforestation at 31.08, 73.97, 20 km, 2019 until now",
+        "deforestation at 31.08, 73.97, 20 km, from 2019 to present",
+        "deforestation at 31.08, 73.97, 20 km, in 2020 and then again 5 years later",
+        "deforestation at 31.08, 73.97, 20 km, last 3 years, starting 2021",
+        "deforestation at 31.08, 73.97, 20 km, 2019 onwards",
+        "deforestation at 31.08, 73.97, 20 km, from 2015 to 2019 and 2 years ago",
+        # partly readable dates
+        "flooding at 31.08, 73.97 20 km wide, monsoon 2022",
+        "flooding at 31.08, 73.97 20 km wide, summer 2022",
+        "flooding at 31.08, 73.97 20 km wide, mid-2022",
+        "flooding at 31.08, 73.97 20 km wide, 2022 June",
+        "flooding at 31.08, 73.97 20 km wide, 15 2022",
+        "flooding at 31.08, 73.97 20 km wide, 03/06/2022",
+        # missing or conflicting fields
+        "deforestation near Atlantis 20 km 2019-2023",
+        "flood and deforestation at 31.08, 73.97, 20 km, 2019",
+        "deforestation at 31.08, 73.97 in 2019, 2020 and 2021 10km",
+        "tree cover loss 31.08, 73.97 over 10 km x 12 km 2019",
+        "deforestation at 31.08, 73.97, 2019 to 2023",
+        "hi there, how does this work?",
+    ]
+
+    def test_rejected_phrasings(self):
+        for text in self.REJECTED:
+            with self.subTest(text=text):
+                self.assertIsNone(parse_request(text))
+
+    def test_assistant_turn_is_not_parsed(self):
+        self.assertIsNone(fastpath_reply([
+            {"role": "gemini", "content": "deforestation at 31.08, 73.97, 20 km wide, 2019 to 2023"},
+        ]))
+
+
+def _history(count, size=100):
+    roles = ["user", "assistant"]
+    return [{"role": roles[i % 2], "content": f"message {i} " + "x" * size} for i in range(count)]
+
+
+@mock.patch.multiple(gemini, HISTORY_TOKEN_BUDGET=100, KEEP_RECENT_MESSAGES=6, SUMMARY_STEP=4)
+class HistoryCompactionTests(SimpleTestCase):
+    """compact_history / _summarize against the offline StubClient."""
+
+    def setUp(self):
+        self.stub = StubClient()
+        gemini.set_client(self.stub)
+        self.addCleanup(gemini.set_client, None)
+
+    def test_history_within_budget_is_unchanged(self):
+        history = _history(3)
+        self.assertIs(gemini.compact_history(history), history)
+        self.assertEqual(self.stub.calls, [])
+
+    def test_folds_at_summary_step_boundaries(self):
+        for count, cut in [(13, 4), (14, 8), (15, 8), (17, 8), (18, 12)]:
+            with self.subTest(count=count):
+                history = _history(count)
+                compacted = gemini.compact_history(history)
+                self.assertTrue(compacted[0]["content"].startswith("Summary of our conversation so far:"))
+                self.assertEqual(compacted[2:], history[cut:])
+
+    def test_same_fold_point_reuses_summary(self):
+        gemini.compact_history(_history(14))
+        gemini.compact_history(_history(15))
+        self.assertEqual(len(self.stub.calls), 1)
+
+    def test_summary_extends_cached_earlier_summary(self):
+        history = _history(14)
+        gemini.compact_history(history[:10])      # summarises messages 0-3
+        gemini.compact_history(history)           # summarises messages 0-7
+
+        self.assertEqual(len(self.stub.calls), 2)
+        first_summary = gemini._summarize(history[:4])      # cached, no new call
+        transcript = self.stub.calls[-1].contents[0]["parts"][0]["text"]
+        earlier, later = transcript.split("\n\nLater messages:\n")
+        self.assertEqual(earlier, f"Summary so far:\n{first_summary}")
+        self.assertNotIn(history[3]["content"], later)
+        self.assertIn(history[4]["content"], later)
+        self.assertIn(history[7]["content"], later)
+
+
+@mock.patch.multiple(gemini, CONTEXT_CACHE=True, CONTEXT_CACHE_RETRY=300)
+class ContextCacheTests(SimpleTestCase):
+    """Explicit context cache creation and its fallback."""
+
+    def setUp(self):
+        self.stub = StubClient()
+        gemini.set_client(self.stub)
+        self.addCleanup(gemini.set_client, None)
+
+    def test_config_uses_created_cache(self):
+        config = gemini._generation_config()
+        self.assertEqual(config.cached_content, "cachedContents/stub-1")
+        self.assertIsNone(config.system_instruction)
+
+    def test_failed_create_falls_back_until_retry_time(self):
+        create = self.stub.caches.create
+        with mock.patch.object(self.stub.caches, "create", side_effect=RuntimeError("too small")):
+            config = gemini._generation_config()
+        self.assertIsNone(config.cached_content)
+        self.assertEqual(config.system_instruction, gemini.SYSTEM_PROMPT)
+
+        with mock.patch.object(self.stub.caches, "create", wraps=create) as retried:
+            self.assertIsNone(gemini._generation_config().cached_content)
+            retried.assert_not_called()
+
+            later = gemini.time.time() + gemini.CONTEXT_CACHE_RETRY + 1
+            with mock.patch.object(gemini.time, "time", return_value=later):
+                self.assertEqual(gemini._generation_config().cached_content, "cachedContents/stub-1")
+            retried.assert_called_once()
+
+
+class ListUserRequestsTests(TestCase):
+    """Keyset paging, sparse fields and ETags of GET my-requests/."""
+
+    URL = "/api/queries/my-requests/"
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("pager", "pw", "pager@example.com")
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+        now = timezone.now()
+        # Two requests share a timestamp, so a page boundary falls between them
+        self.older = self._request("older", now - timedelta(days=1))
+        self.tied_first = self._request("tied first", now)
+        self.tied_second = self._request("tied second", now)
+        self.newest = self._request("newest", now + timedelta(days=1))
+
+    def _request(self, region_name, submitted_at):
+        obj = ParsedRequest.objects.create(
+            user=self.user, region_name=region_name, date_range_start="2020-01-01",
+            date_range_end="2021-01-01", interval_length=1, latitude=31.5, longitude=74.3,
+            distance_to_edge=5000, study_type="deforestation",
+        )
+        # submitted_at is auto_now_add, so it is set afterwards
+        ParsedRequest.objects.filter(pk=obj.pk).update(submitted_at=submitted_at)
+        return obj
+
+    def _pages(self, limit):
+        pages, cursor = [], None
+        while True:
+            params = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+            response = self.api.get(self.URL, params)
+            self.assertEqual(response.status_code, 200)
+            pages.append([r["request_id"] for r in response.data["results"]])
+            cursor = response.data["next_cursor"]
+            if cursor is None:
+                return pages
+
+    def test_pages_split_tied_timestamps(self):
+        expected = [self.newest, self.tied_second, self.tied_first, self.older]
+        for limit in (1, 2, 3):
+            with self.subTest(limit=limit):
+                pages = self._pages(limit)
+                self.assertEqual(sum(pages, []), [r.request_id for r in expected])
+                self.assertTrue(all(len(page) <= limit for page in pages))
+
+    def test_invalid_cursor(self):
+        for cursor in ["not a cursor", base64.urlsafe_b64encode(b"no-separator").decode(), "%%%"]:
+            with self.subTest(cursor=cursor):
+                response = self.api.get(self.URL, {"cursor": cursor})
+                self.assertEqual(response.status_code, 400)
+
+    def test_fields_subset(self):
+        response = self.api.get(self.URL, {"fields": "request_id, region_name"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data["results"][0]), {"request_id", "region_name"})
+
+    def test_unknown_field(self):
+        response = self.api.get(self.URL, {"fields": "region_name,password"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("password", response.data["error"])
+
+    def test_if_none_match(self):
+        response = self.api.get(self.URL)
+        etag = response["ETag"]
+
+        self.assertEqual(self.api.get(self.URL, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self._request("another", timezone.now() + timedelta(days=2))
+        self.assertEqual(self.api.get(self.URL, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_other_users_requests_are_hidden(self):
+        other = get_user_model().objects.create_user("other", "pw", "other@example.com")
+        self.api.force_authenticate(other)
+        self.assertEqual(self.api.get(self.URL).data["results"], [])
@@ -1,10 +1,12 @@
 from django.urls import path
-from .views import chat_with_gemini, create_parsed_request, list_user_requests
+from .views import chat_with_gemini, chat_with_gemini_stream, create_parsed_request, geocode_place, list_user_requests
 
 
 
 urlpatterns = [
     path("chat/", chat_with_gemini, name="chat_with_gemini"),
+    path("chat/stream/", chat_with_gemini_stream, name="chat_with_gemini_stream"),
     path('parsed-request/', create_parsed_request, name='create-parsed-request'),
     path("my-requests/", list_user_requests, name="list_user_requests"),
+    path("geocode/", geocode_place, name="geocode_place"),
 ]
@@ -1,9 +1,24 @@
+import base64
+import binascii
+import hashlib
+import json
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import JsonResponse, StreamingHttpResponse
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status as drf_status
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
 
-from .gemini import get_gemini_reply
+from . import geocode
+from .fastpath import fastpath_reply
+from .gemini import get_gemini_reply, stream_gemini_reply
 from .models import ParsedRequest
 from .serializers import ParsedRequestSerializer
 
@@ -19,10 +34,74 @@ def chat_with_gemini(request):
     if not messages or not isinstance(messages, list):
         return Response({"error": "messages[] is required"}, status=400)
 
-    reply = get_gemini_reply(messages)
+    # Complete requests are parsed locally; only the rest go to Gemini
+    reply = fastpath_reply(messages)
+    if reply is None:
+        reply = get_gemini_reply(messages)
+        geocode.remember_parsed_reply(reply)
     return Response({"reply": reply})
 
 
+def _sse(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+
+async def chat_with_gemini_stream(request):
+    """
+    Streaming variant of chat_with_gemini (async view, serve through ASGI).
+    Same request body; the reply comes back as server-sent events:
+      event: delta  data: {"text": "..."}   for every chunk
+      event: done   data: {"reply": "..."}  with the full text
+      event: error  data: {"error": "..."}
+    DRF views are sync-only, so the JWT is checked by hand.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "POST required"}, status=405)
+
+    try:
+        auth = await sync_to_async(JWTAuthentication().authenticate)(request)
+    except (InvalidToken, AuthenticationFailed):
+        auth = None
+    if auth is None:
+        return JsonResponse({"detail": "Authentication credentials were not provided or are invalid."}, status=401)
+
+    try:
+        messages = json.loads(request.body or b"{}").get("messages")
+    except (ValueError, AttributeError):
+        messages = None
+    if not messages or not isinstance(messages, list):
+        return JsonResponse({"error": "messages[] is required"}, status=400)
+
+    local_reply = await sync_to_async(fastpath_reply)(messages)
+
+    async def events():
+        if local_reply:
+            yield _sse("delta", {"text": local_reply})
+            yield _sse("done", {"reply": local_reply})
+            return
+
+        parts = []
+        try:
+            async for text in stream_gemini_reply(messages):
+                parts.append(text)
+                yield _sse("delta", {"text": text})
+        except Exception as e:
+            yield _sse("error", {"error": str(e)})
+            return
+        reply = "".join(parts)
+        yield _sse("done", {"reply": reply})
+        await sync_to_async(geocode.remember_parsed_reply)(reply)
+
+    response = StreamingHttpResponse(events(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # keep reverse proxies from buffering the stream
+    return response
+
+
+# csrf_exempt() wraps views in a sync function on Django 4.2; set the flag directly
+chat_with_gemini_stream.csrf_exempt = True
+
+
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def create_parsed_request(request):
@@ -69,16 +148,121 @@ def create_parsed_request(request):
 
     return Response(serializer.errors, status=drf_status.HTTP_400_BAD_REQUEST)
 
+REQUESTS_PAGE_SIZE = 50
+REQUESTS_MAX_PAGE_SIZE = 200
+
+
+def _encode_cursor(obj):
+    raw = f"{obj.submitted_at.isoformat()}|{obj.request_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(cursor):
+    """(submitted_at, request_id) of the last row of the previous page."""
+    submitted_at, request_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+    return datetime.fromisoformat(submitted_at), int(request_id)
+
+
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def list_user_requests(request):
     """
-    Returns all ParsedRequest objects for the logged-in user.
+    Returns the logged-in user's ParsedRequests, newest first, one page at a time:
+      { "results": [...], "next_cursor": "<cursor>" | null }
+
+    Query params:
+      limit   page size (default 50, max 200)
+      cursor  next_cursor of the previous page (keyset, so every page is an index range scan)
+      fields  comma-separated subset of fields to return
+    Responses carry an ETag; a matching If-None-Match gets 304.
     """
-    user = request.user
+    params = request.query_params
+
+    try:
+        limit = min(int(params.get("limit", REQUESTS_PAGE_SIZE)), REQUESTS_MAX_PAGE_SIZE)
+        if limit < 1:
+            raise ValueError
+    except ValueError:
+        return Response({"error": "limit must be a positive integer."}, status=drf_status.HTTP_400_BAD_REQUEST)
+
+    fields = None
+    if params.get("fields"):
+        fields = [f.strip() for f in params["fields"].split(",") if f.strip()]
+        unknown = set(fields) - set(ParsedRequestSerializer.Meta.fields)
+        if unknown:
+            return Response(
+                {"error": f"Unknown fields: {', '.join(sorted(unknown))}"},
+                status=drf_status.HTTP_400_BAD_REQUEST,
+            )
+
+    requests_qs = ParsedRequest.objects.filter(user=request.user).order_by("-submitted_at", "-request_id")
+
+    if params.get("cursor"):
+        try:
+            submitted_at, request_id = _decode_cursor(params["cursor"])
+        except (ValueError, UnicodeDecodeError, binascii.Error):
+            return Response({"error": "Invalid cursor."}, status=drf_status.HTTP_400_BAD_REQUEST)
+        requests_qs = requests_qs.filter(
+            Q(submitted_at__lt=submitted_at) | Q(submitted_at=submitted_at, request_id__lt=request_id)
+        )
+
+    if fields is not None:
+        # The cursor columns are always loaded
+        columns = {"user_id" if f == "user" else f for f in fields} | {"request_id", "submitted_at"}
+        requests_qs = requests_qs.only(*columns)
+
+    # One extra row tells whether there is a next page
+    page = list(requests_qs[:limit + 1])
+    next_cursor = _encode_cursor(page[limit - 1]) if len(page) > limit else None
+    page = page[:limit]
 
-    requests_qs = ParsedRequest.objects.filter(user=user).order_by("-submitted_at")
+    data = {
+        "results": ParsedRequestSerializer(page, many=True, fields=fields).data,
+        "next_cursor": next_cursor,
+    }
 
-    serializer = ParsedRequestSerializer(requests_qs, many=True)
+    etag = '"' + hashlib.sha1(json.dumps(data, cls=DjangoJSONEncoder).encode()).hexdigest() + '"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag in request.headers.get("If-None-Match", ""):
+        return Response(status=drf_status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    return Response(data, status=drf_status.HTTP_200_OK, headers=headers)
+
+
+@api_view(["GET", "POST"])
+@permission_classes([IsAuthenticated])
+def geocode_place(request):
+    """
+    GET  ?q=<place name>  -> cached {name, latitude, longitude, bbox, source}, 404 if unknown
+    POST {name, latitude, longitude, bbox?}  -> stores a place resolved on the map
+    """
+    if request.method == "GET":
+        name = request.query_params.get("q", "").strip()
+        if not name:
+            return Response({"error": "q is required"}, status=drf_status.HTTP_400_BAD_REQUEST)
+
+        place = geocode.lookup(name)
+        if place is None:
+            return Response({"error": "Unknown place"}, status=drf_status.HTTP_404_NOT_FOUND)
+        return Response(place, status=drf_status.HTTP_200_OK)
+
+    data = request.data
+    bbox = data.get("bbox")
+    try:
+        latitude, longitude = float(data["latitude"]), float(data["longitude"])
+        if bbox is not None:
+            bbox = [float(v) for v in bbox]
+            if len(bbox) != 4:
+                raise ValueError
+    except (KeyError, TypeError, ValueError):
+        return Response(
+            {"error": "latitude/longitude must be numbers and bbox [west, south, east, north]."},
+            status=drf_status.HTTP_400_BAD_REQUEST,
+        )
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return Response({"error": "latitude/longitude out of range."}, status=drf_status.HTTP_400_BAD_REQUEST)
 
-    return Response(serializer.data, status=drf_status.HTTP_200_OK)
+    place = geocode.remember(str(data.get("name", "")), latitude, longitude, bbox=bbox, source="map")
+    if place is None:
+        return Response({"error": "name is required"}, status=drf_status.HTTP_400_BAD_REQUEST)
+    return Response(place, status=drf_status.HTTP_201_CREATED)
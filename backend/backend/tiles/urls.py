@@ -0,0 +1,7 @@
+from django.urls import path
+from .views import raster_tile
+
+
+urlpatterns = [
+    path("<str:kind>/<int:pk>/<int:z>/<int:x>/<int:y>.png", raster_tile, name="raster_tile"),
+]
@@ -0,0 +1,64 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from deforestation.models import DeforestationRun
+from lulc.models import LULCYearResult
+from processing.tile_renderer import render_tile, tile_etag
+
+# kind -> (model, owner lookup, raster path field, render style)
+TILE_SOURCES = {
+    "lulc-mask": (LULCYearResult, "study__parsed_request__user", "mask_path", "classes"),
+    "lulc-image": (LULCYearResult, "study__parsed_request__user", "image_path", "rgb"),
+    "deforestation-mask": (DeforestationRun, "parsed_request__user", "mask_path", "change"),
+    "deforestation-before": (DeforestationRun, "parsed_request__user", "before_image_path", "rgb"),
+    "deforestation-after": (DeforestationRun, "parsed_request__user", "after_image_path", "rgb"),
+}
+
+MAX_ZOOM = 22
+RASTER_SUFFIXES = {".tif", ".tiff", ".vrt"}
+
+
+def _resolve_raster(stored_path):
+    """Stored paths are either relative to the worker's cwd (data/...) or to MEDIA_ROOT."""
+    if not stored_path:
+        return None
+    for candidate in (Path(stored_path), Path(settings.MEDIA_ROOT) / stored_path):
+        if candidate.suffix.lower() in RASTER_SUFFIXES and candidate.is_file():
+            return candidate
+    return None
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def raster_tile(request, kind, pk, z, x, y):
+    """
+    Renders XYZ tile z/x/y of a result raster (LULC mask/imagery,
+    deforestation mask/before/after) as a PNG. Only the owner of the
+    underlying request can fetch its tiles.
+    """
+    source = TILE_SOURCES.get(kind)
+    if source is None:
+        return Response({"error": f"Unknown tile kind '{kind}'"}, status=404)
+    if z > MAX_ZOOM or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        return Response({"error": "Tile out of range"}, status=404)
+
+    model, owner, field, style = source
+    obj = model.objects.filter(pk=pk, **{owner: request.user}).only(field).first()
+    path = _resolve_raster(getattr(obj, field, None))
+    if path is None:
+        return Response({"error": "Raster not available"}, status=404)
+
+    etag = tile_etag(path, style, z, x, y)
+    if etag in request.headers.get("If-None-Match", ""):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(render_tile(path, style, z, x, y), content_type="image/png")
+
+    response["ETag"] = etag
+    response["Cache-Control"] = "private, max-age=3600"
+    return response
@@ -75,3 +75,51 @@ api.interceptors.response.use(
 );
 
 export default api;
+
+
+// =============================
+// Streaming chat (server-sent events over POST)
+// =============================
+// EventSource can't POST or send headers, so the stream is read with fetch.
+// onText(partial) receives the reply accumulated so far; resolves with the full reply.
+export async function streamChat(messages, onText) {
+  const res = await fetch(`${api.defaults.baseURL}queries/chat/stream/`, {
+    method: "POST",
+    headers: {
+      "Content-Type": "application/json",
+      Authorization: `Bearer ${localStorage.getItem("access_token")}`,
+    },
+    body: JSON.stringify({ messages }),
+  });
+  if (!res.ok || !res.body) throw new Error(`Chat stream failed (${res.status})`);
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let reply = "";
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let sep;
+    while ((sep = buffer.indexOf("\n\n")) !== -1) {
+      const raw = buffer.slice(0, sep);
+      buffer = buffer.slice(sep + 2);
+
+      const event = raw.match(/^event: (.*)$/m)?.[1] ?? "message";
+      const data = JSON.parse(raw.match(/^data: (.*)$/m)?.[1] ?? "{}");
+
+      if (event === "delta") {
+        reply += data.text;
+        onText(reply);
+      } else if (event === "done") {
+        return data.reply ?? reply;
+      } else if (event === "error") {
+        throw new Error(data.error);
+      }
+    }
+  }
+  return reply;
+}
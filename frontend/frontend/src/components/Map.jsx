@@ -5,6 +5,7 @@ import "@mapbox/mapbox-gl-draw/dist/mapbox-gl-draw.css";
 import "../styles/Map.css";
 import MapControls from "./mapControls/MapControls";
 import { v4 as uuidv4 } from "uuid";
+import api from "../api";
 
 mapboxgl.accessToken = import.meta.env.VITE_MAPBOX_TOKEN;
 
@@ -13,6 +14,15 @@ const MASK_LAYER_ID = "deforestation-mask-layer";
 const LULC_SOURCE_ID = "lulc-overlay-source";
 const LULC_LAYER_ID = "lulc-overlay-layer";
 
+// Result rasters (GeoTIFF/VRT) are served as XYZ tiles rendered on the fly
+const TILE_URL = "http://localhost:8000/api/tiles";
+const isRasterPath = (path) => /\.(tiff?|vrt)$/i.test(path ?? "");
+const tileSource = (kind, id) => ({
+  type: "raster",
+  tiles: [`${TILE_URL}/${kind}/${id}/{z}/{x}/{y}.png`],
+  tileSize: 256,
+});
+
 export default function Map({
   query,
   setQuery,
@@ -117,6 +127,11 @@ export default function Map({
       style: "mapbox://styles/mapbox/satellite-streets-v12",
       center: [74.303056, 31.481111],
       zoom: 12,
+      // Tile requests need the same JWT as the rest of the API
+      transformRequest: (url) =>
+        url.startsWith(TILE_URL)
+          ? { url, headers: { Authorization: `Bearer ${localStorage.getItem("access_token")}` } }
+          : { url },
     });
     mapRef.current = m;
     if (mapInstanceRef) mapInstanceRef.current = m;
@@ -348,6 +363,10 @@ export default function Map({
 
     const selectedUrl = activeOverlay === "before" ? beforeUrl : activeOverlay === "after" ? afterUrl : changeUrl;
 
+    const run = deforestationResult.deforestation_result;
+    const selectedPath = activeOverlay === "before" ? run?.before_image_path : activeOverlay === "after" ? run?.after_image_path : run?.mask_path;
+    const tileKind = activeOverlay === "before" ? "deforestation-before" : activeOverlay === "after" ? "deforestation-after" : "deforestation-mask";
+
     const addMask = () => {
       const lat = deforestationResult.latitude;
       const lng = deforestationResult.longitude;
@@ -364,7 +383,8 @@ export default function Map({
       if (map.getLayer(MASK_LAYER_ID)) map.removeLayer(MASK_LAYER_ID);
       if (map.getSource(MASK_SOURCE_ID)) map.removeSource(MASK_SOURCE_ID);
 
-      map.addSource(MASK_SOURCE_ID, { type: "image", url: selectedUrl, coordinates: [tl, tr, br, bl] });
+      if (run?.id != null && isRasterPath(selectedPath)) map.addSource(MASK_SOURCE_ID, tileSource(tileKind, run.id));
+      else map.addSource(MASK_SOURCE_ID, { type: "image", url: selectedUrl, coordinates: [tl, tr, br, bl] });
       map.addLayer({ id: MASK_LAYER_ID, type: "raster", source: MASK_SOURCE_ID, paint: { "raster-opacity": 0.5 } });
     };
 
@@ -441,7 +461,11 @@ export default function Map({
 
       map.flyTo({ center: [lng, lat], zoom: 11 });
 
-      map.addSource(LULC_SOURCE_ID, { type: "image", url, coordinates: [tl, tr, br, bl] });
+      if (yearData.id != null && isRasterPath(imagePath)) {
+        map.addSource(LULC_SOURCE_ID, tileSource(lulcOverlayType === "imagery" ? "lulc-image" : "lulc-mask", yearData.id));
+      } else {
+        map.addSource(LULC_SOURCE_ID, { type: "image", url, coordinates: [tl, tr, br, bl] });
+      }
       map.addLayer({ id: LULC_LAYER_ID, type: "raster", source: LULC_SOURCE_ID, paint: { "raster-opacity": 1.0 } });
     };
 
@@ -498,14 +522,25 @@ export default function Map({
     if (!placeId) return;
 
     try {
-      const API_KEY = import.meta.env.VITE_GOOGLE_MAPS_KEY;
-      const FIELD_MASK = "location";
-      const url = `https://places.googleapis.com/v1/places/${placeId}?fields=${FIELD_MASK}`;
-      const response = await fetch(url, { method: "GET", headers: { "Content-Type": "application/json", "X-Goog-Api-Key": API_KEY, "X-Goog-FieldMask": FIELD_MASK } });
-      const data = await response.json();
-      if (!data.location) return;
+      // Backend geocode cache first; Places details only on a miss
+      let location = await api
+        .get("/queries/geocode/", { params: { q: prediction.text } })
+        .then((res) => res.data)
+        .catch(() => null);
+
+      if (!location) {
+        const API_KEY = import.meta.env.VITE_GOOGLE_MAPS_KEY;
+        const FIELD_MASK = "location";
+        const url = `https://places.googleapis.com/v1/places/${placeId}?fields=${FIELD_MASK}`;
+        const response = await fetch(url, { method: "GET", headers: { "Content-Type": "application/json", "X-Goog-Api-Key": API_KEY, "X-Goog-FieldMask": FIELD_MASK } });
+        const data = await response.json();
+        if (!data.location) return;
+
+        location = data.location;
+        api.post("/queries/geocode/", { name: prediction.text, ...data.location }).catch(() => {});
+      }
 
-      const { latitude, longitude } = data.location;
+      const { latitude, longitude } = location;
       mapRef.current?.flyTo({ center: [longitude, latitude], zoom: 14 });
       setQuery(prediction.text);
       setSuggestions([]);
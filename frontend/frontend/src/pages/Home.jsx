@@ -9,7 +9,7 @@ import DeforestationPanel from "../components/DeforestationPanel";
 import LULCPanel from "../components/LULCPanel";
 import ManualRequestPanel from "../components/ManualRequestPanel";
 
-import api from "../api";
+import api, { streamChat } from "../api";
 import logo from "../assets/logoText.png";
 import "../styles/Home.css";
 
@@ -143,15 +143,39 @@ export default function Home() {
     setInput("");
     setLoading(true);
 
-    try {
-      const response = await api.post("/queries/chat/", {
-        messages: [...messages, userMessage].map(m => ({
-          role: m.sender,
-          content: m.text,
-        })),
-      });
+    const history = [...messages, userMessage].map(m => ({
+      role: m.sender,
+      content: m.text,
+    }));
+
+    // Partial reply shown while streaming; replaced by the final message below
+    const showPartial = text => {
+      setLoading(false);
+      setMessages(prev => [
+        ...(prev[prev.length - 1]?.streaming ? prev.slice(0, -1) : prev),
+        { sender: "gemini", text, streaming: true },
+      ]);
+    };
+    const dropPartial = () =>
+      setMessages(prev => (prev[prev.length - 1]?.streaming ? prev.slice(0, -1) : prev));
 
-      const replyText = response.data.reply || "";
+    try {
+      let replyText;
+      try {
+        replyText = await streamChat(history, partial => {
+          // Don't flash a PARSED payload at the user
+          const head = partial.trimStart().slice(0, 6);
+          if (head !== "PARSED".slice(0, head.length)) showPartial(partial);
+        });
+      } catch (streamErr) {
+        // Fall back to the blocking endpoint (also handles token refresh)
+        console.warn(streamErr);
+        dropPartial();
+        setLoading(true);
+        const response = await api.post("/queries/chat/", { messages: history });
+        replyText = response.data.reply || "";
+      }
+      dropPartial();
 
       if (replyText.trim().startsWith("PARSED")) {
         const jsonMatch = replyText.match(/PARSED\s*([\s\S]*)/);
@@ -179,6 +203,7 @@ export default function Home() {
       }
     } catch (err) {
       console.error(err);
+      dropPartial();
       setMessages(prev => [...prev, { sender: "gemini", text: "Error: Could not get response." }]);
     } finally {
       setLoading(false);
@@ -8,6 +8,7 @@ export default function Requests() {
   const navigate = useNavigate();
   const [optionsOpen, setOptionsOpen] = useState(false);
   const [requests, setRequests] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [filter, setFilter] = useState("All");
   const [search, setSearch] = useState("");
 
@@ -17,13 +18,19 @@ export default function Requests() {
     fetchRequests();
   }, [navigate]);
 
-  const fetchRequests = async () => {
+  // Paged newest-first; only the columns this table shows are fetched
+  const fetchRequests = async (cursor = null) => {
     try {
       const token = localStorage.getItem("access_token");
       const res = await api.get("/queries/my-requests/", {
         headers: { Authorization: `Bearer ${token}` },
+        params: {
+          fields: "request_id,region_name,study_type,submitted_at,status",
+          ...(cursor && { cursor }),
+        },
       });
-      setRequests(res.data);
+      setRequests((prev) => (cursor ? [...prev, ...res.data.results] : res.data.results));
+      setNextCursor(res.data.next_cursor);
     } catch (err) {
       console.error(err);
     }
@@ -174,6 +181,11 @@ export default function Requests() {
               </tbody>
             </table>
           )}
+          {nextCursor && (
+            <button className="filter-btn" onClick={() => fetchRequests(nextCursor)}>
+              Load more
+            </button>
+          )}
         </div>
       </div>
     </div>